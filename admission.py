@@ -0,0 +1,121 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class Overloaded(Exception):
+    """A request couldn't get a provider slot (queue full or deadline passed)"""
+
+
+class TokenBucket:
+    """Requests-per-second limiter: `rate` tokens per second, up to `burst` saved up"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, deadline: float):
+        """Take one token, waiting for it unless that would run past `deadline` (monotonic)"""
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise Overloaded("rate limit")
+            await asyncio.sleep(wait)
+
+
+class ProviderLimiter:
+    """Concurrency cap + optional rate limit for one upstream provider.
+
+    Callers beyond `max_concurrent` wait in a bounded queue; a caller is turned
+    away immediately when `max_waiting` others are already queued, and gives up
+    once it has waited `max_wait` seconds, so a burst degrades into fast,
+    explicit Overloaded errors instead of provider 429s and piled-up turns.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, rate: float = 0, burst: Optional[float] = None,
+                 max_waiting: int = 64, max_wait: float = 5.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None) -> AsyncIterator[None]:
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise Overloaded(f"{self.name}: wait queue is full")
+
+        deadline = time.monotonic() + (self.max_wait if max_wait is None else max_wait)
+        self.waiting += 1
+        acquired = False
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(0.0, deadline - time.monotonic()))
+            acquired = True
+            if self._bucket:
+                await self._bucket.acquire(deadline)
+        except (asyncio.TimeoutError, Overloaded):
+            if acquired:
+                self._slots.release()
+            self.timed_out += 1
+            raise Overloaded(f"{self.name}: no capacity within deadline")
+        except BaseException:
+            if acquired:
+                self._slots.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class SessionGate:
+    """Caps concurrent calls per worker"""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self.active = 0
+        self.rejected = 0
+
+    def try_enter(self) -> bool:
+        if self.active >= self.max_sessions:
+            self.rejected += 1
+            return False
+        self.active += 1
+        return True
+
+    def leave(self):
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"active": self.active, "max": self.max_sessions, "rejected": self.rejected}
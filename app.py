@@ -1,34 +1,218 @@
 from fastapi import FastAPI, WebSocket, File, UploadFile, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import math
+import numpy as np
+import threading
+from contextlib import asynccontextmanager
+import time
 import json
 import base64
-from elevenlabs import generate
+import hashlib
 import os
-from openai import OpenAI
-from typing import Dict, Optional
-import PyPDF2
-import io
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-from dataclasses import dataclass 
-from typing import List
+import uuid
+from openai import APITimeoutError, OpenAI, RateLimitError
+from typing import AsyncIterator, Dict, List, Optional
+from encoder_service import EmbeddingBatcher, EncoderService
+from kb_index import KnowledgeBase, RetrievalResult, split_into_chunks, split_pages_into_chunks
+from clients import ProviderClients
+from streaming import ResponseChunk, SentenceSplitter
+from tts_cache import AudioCache
+from ingest_cache import IngestCache
+from kb_store import load_snapshot, save_snapshot
+from pdf_extract import create_pool, iter_pdf_pages
+from query_cache import QueryCache, normalize_query
+from history import ConversationHistory
+from admission import Overloaded, ProviderLimiter, SessionGate
+from metrics import Metrics
+from session_store import open_session_store
+from transcripts import TranscriptRecorder
+from intents import CANCEL_END, CONFIRM_END, END_CALL, RESUME, IntentRouter
 from datetime import datetime
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+app = FastAPI(lifespan=lifespan)
 ELEVEN_LABS_API_KEY = os.environ.get("ELEVEN_LABS_API_KEY")
+# Alternate API endpoint (e.g. the local stand-in used by benchmarks/bench_load.py); OpenAI reads OPENAI_BASE_URL itself
+ELEVEN_LABS_BASE_URL = os.environ.get("ELEVEN_LABS_BASE_URL") or None
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 END_CALL_PHRASES = ["end call", "end the call", "goodbye", "good day", "bye", "quit", "stop", "hang up", 
     "end conversation", "that's all", "thank you bye", "thanks bye", "stop the call", "leave me alone", "thank you"]
+ENCODER_MODEL_NAME = os.environ.get("ENCODER_MODEL_NAME", "all-MiniLM-L6-v2")
+ENCODER_READY_TIMEOUT = float(os.environ.get("ENCODER_READY_TIMEOUT", "30"))
+# Query encodes from all sessions are batched for up to this long / this many
+EMBED_BATCH_MAX_WAIT_MS = float(os.environ.get("EMBED_BATCH_MAX_WAIT_MS", "5"))
+EMBED_BATCH_MAX_SIZE = int(os.environ.get("EMBED_BATCH_MAX_SIZE", "32"))
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+# Interim transcripts shorter than this (normalized) don't start speculative retrieval
+SPECULATIVE_MIN_CHARS = int(os.environ.get("SPECULATIVE_MIN_CHARS", "8"))
+# Token budget for the turns kept verbatim in each call's history
+HISTORY_MAX_TOKENS = int(os.environ.get("HISTORY_MAX_TOKENS", "1500"))
+# Pooled keep-alive connections per provider, and how many to open during prewarm
+PROVIDER_MAX_CONNECTIONS = int(os.environ.get("PROVIDER_MAX_CONNECTIONS", "100"))
+PROVIDER_PREWARM_CONNECTIONS = int(os.environ.get("PROVIDER_PREWARM_CONNECTIONS", "2"))
+# Concurrent upstream calls and requests/second per provider (0 = no rate limit)
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "32"))
+OPENAI_RATE_PER_SEC = float(os.environ.get("OPENAI_RATE_PER_SEC", "0"))
+TTS_MAX_CONCURRENCY = int(os.environ.get("TTS_MAX_CONCURRENCY", "10"))
+TTS_RATE_PER_SEC = float(os.environ.get("TTS_RATE_PER_SEC", "0"))
+# Calls waiting for a provider slot, and how long each may wait before the hold message is played
+PROVIDER_MAX_QUEUE = int(os.environ.get("PROVIDER_MAX_QUEUE", "64"))
+PROVIDER_QUEUE_TIMEOUT = float(os.environ.get("PROVIDER_QUEUE_TIMEOUT", "5"))
+# Concurrent /ws calls per worker; further callers are turned away
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "200"))
+# Call state and shared config: memory:// (single worker) or sqlite:///path (all workers on the host)
+SESSION_STORE_URL = os.environ.get("SESSION_STORE_URL", "memory://")
+# Saved state of a dropped call can be resumed for this long
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "3600"))
+# How often workers check for a prompt / knowledge base published by another worker
+CONFIG_POLL_INTERVAL = float(os.environ.get("CONFIG_POLL_INTERVAL", "1"))
+# Call transcripts/entities: JSONL logs plus one client_data_*.json per call ("" disables).
+# Written behind the calls, fsynced every TRANSCRIPT_FLUSH_INTERVAL seconds
+TRANSCRIPT_DIR = os.environ.get("TRANSCRIPT_DIR", "client_conversation")
+TRANSCRIPT_FLUSH_INTERVAL = float(os.environ.get("TRANSCRIPT_FLUSH_INTERVAL", "1"))
+TTS_VOICE = "Aria"
+TTS_MODEL = "eleven_flash_v2_5"
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Unset to keep the audio cache in memory only
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+# Disk budget of the audio cache; least recently used clips are deleted past it
+TTS_CACHE_DISK_MAX_BYTES = int(os.environ.get("TTS_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+GREETING = "Hello! I'm calling from Toshal Infotech. I'd love to discuss how our services could benefit your business. Is this a good time to talk?"
+END_CALL_CONFIRMATION = "Would you like to end our conversation?"
+FAREWELL = "Thank you for your time. Have a great day! Goodbye!"
+CONTINUE_CALL = "Of course, let's continue. What else would you like to know?"
+# Played when a turn can't get provider capacity in time
+HOLD_MESSAGE = "Sorry, one moment please. Could you say that again?"
+# Fixed utterances synthesized once at startup and pinned in the audio cache
+STATIC_PHRASES = [GREETING, END_CALL_CONFIRMATION, FAREWELL, CONTINUE_CALL, HOLD_MESSAGE]
+# Control turns (end call, yes/no to the confirmation) are answered without RAG or the LLM
+intent_router = IntentRouter(END_CALL_PHRASES)
+# Corpus size (in chunks) above which retrieval switches to the IVF index
+KB_ANN_THRESHOLD = int(os.environ.get("KB_ANN_THRESHOLD", "50000"))
+KB_ANN_NPROBE = int(os.environ.get("KB_ANN_NPROBE", "16"))
+# Per-document artifacts of /upload_knowledge, keyed by the file's SHA-256
+INGEST_CACHE_DIR = os.environ.get("INGEST_CACHE_DIR", "ingest_cache")
+# Persistent, memory-mapped knowledge base (float32 or float16 vectors)
+KB_STORE_DIR = os.environ.get("KB_STORE_DIR", "kb_store")
+KB_STORE_DTYPE = os.environ.get("KB_STORE_DTYPE", "float32")
+# Store versions kept on disk, so workers still loading the previous one can finish
+KB_STORE_KEEP_VERSIONS = int(os.environ.get("KB_STORE_KEEP_VERSIONS", "3"))
+# In-memory vectors: float32, float16 or int8. The compact ones keep a full-precision
+# copy on disk (in KB_SPILL_DIR) and re-rank the top KB_RERANK_CANDIDATES against it.
+# float16 halves memory but scores several times slower than float32 (numpy upcasts
+# it in software); int8 quarters it and stays close to float32 speed
+KB_INDEX_DTYPE = os.environ.get("KB_INDEX_DTYPE", "float32")
+KB_RERANK_CANDIDATES = int(os.environ.get("KB_RERANK_CANDIDATES", "32"))
+KB_SPILL_DIR = os.environ.get("KB_SPILL_DIR", KB_STORE_DIR)
+# Prebuilt index bundle from `python knowledge_base.py --batch <pdf_dir>`
+KB_BUNDLE_DIR = os.environ.get("KB_BUNDLE_DIR")
+# Processes used to extract large PDFs page range by page range (default: all cores)
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", "0")) or None
+
+# Shared across all sessions; loaded once at startup
+encoder_service = EncoderService(ENCODER_MODEL_NAME)
+embedding_batcher = EmbeddingBatcher(encoder_service, max_batch=EMBED_BATCH_MAX_SIZE, max_wait_ms=EMBED_BATCH_MAX_WAIT_MS)
+provider_clients = ProviderClients(
+    OPENAI_API_KEY, ELEVEN_LABS_API_KEY, max_connections=PROVIDER_MAX_CONNECTIONS,
+    openai_limiter=ProviderLimiter("openai", OPENAI_MAX_CONCURRENCY, rate=OPENAI_RATE_PER_SEC,
+                                   max_waiting=PROVIDER_MAX_QUEUE, max_wait=PROVIDER_QUEUE_TIMEOUT),
+    tts_limiter=ProviderLimiter("elevenlabs", TTS_MAX_CONCURRENCY, rate=TTS_RATE_PER_SEC,
+                                max_waiting=PROVIDER_MAX_QUEUE, max_wait=PROVIDER_QUEUE_TIMEOUT),
+    elevenlabs_base_url=ELEVEN_LABS_BASE_URL
+)
+audio_cache = AudioCache(max_bytes=TTS_CACHE_MAX_BYTES, disk_dir=TTS_CACHE_DIR or None,
+                         disk_max_bytes=TTS_CACHE_DISK_MAX_BYTES)
+session_gate = SessionGate(MAX_SESSIONS)
+metrics = Metrics("sales_agent")
+metrics.describe("stage_seconds", "Latency of each call and ingest stage")
+metrics.describe("client_seconds", "Latency measured by the client for a traced turn")
+metrics.describe("llm_tokens_total", "gpt-4o tokens used")
+metrics.describe("audio_bytes_total", "Audio bytes synthesized by ElevenLabs or sent to callers")
+metrics.describe("turns_total", "Caller turns by outcome")
+metrics.describe("speculation_total", "Speculative retrievals by outcome")
+# Failures that mean "busy, try again" rather than a broken turn (ElevenLabs 429s and
+# timeouts arrive as Overloaded from ProviderClients.synthesize)
+PROVIDER_BUSY_ERRORS = (Overloaded, RateLimitError, APITimeoutError)
+
+async def synthesize_uncached(text: str, voice: str, model: str) -> bytes:
+    with metrics.span("tts"):
+        audio = await provider_clients.synthesize(text, voice, model)
+    metrics.inc("audio_bytes_total", len(audio), direction="synthesized")
+    return audio
+
+async def synthesize_speech(text: str) -> bytes:
+    """TTS through the audio cache; identical utterances are only paid for once"""
+    return await audio_cache.get_or_synthesize(text, TTS_VOICE, TTS_MODEL, synthesize_uncached)
+
+def record_usage(usage):
+    if usage is not None:
+        metrics.inc("llm_tokens_total", usage.prompt_tokens, kind="prompt")
+        metrics.inc("llm_tokens_total", usage.completion_tokens, kind="completion")
 
-@dataclass
-class RetrievalResult:
-    chunks: List[str]
-    similarities: List[float]
-    sources: List[str]
-    page_numbers: List[int]
+def collect_runtime():
+    """Numbers the components keep themselves, read at scrape time"""
+    yield "active_sessions", "gauge", "Calls currently connected", {}, session_gate.active
+    yield "rejected_sessions_total", "counter", "Calls refused at the session limit", {}, session_gate.rejected
+    yield "cache_hits_total", "counter", "Cache hits", {"cache": "tts"}, audio_cache.hits
+    yield "cache_hits_total", "counter", "Cache hits", {"cache": "query_embedding"}, query_cache.embedding_hits
+    yield "cache_hits_total", "counter", "Cache hits", {"cache": "query_result"}, query_cache.result_hits
+    yield "cache_misses_total", "counter", "Cache misses", {"cache": "tts"}, audio_cache.misses
+    yield "cache_misses_total", "counter", "Cache misses", {"cache": "query_embedding"}, query_cache.embedding_misses
+    yield "cache_misses_total", "counter", "Cache misses", {"cache": "query_result"}, query_cache.result_misses
+    yield "tts_cache_bytes", "gauge", "Audio held in the memory cache", {}, audio_cache.bytes
+    yield "tts_cache_disk_bytes", "gauge", "Audio files kept in the disk cache", {}, audio_cache.disk_bytes
+    transcripts = transcript_recorder.stats()
+    yield "transcript_events_total", "counter", "Call events recorded", {}, transcripts["events"]
+    yield "transcript_pending", "gauge", "Call events waiting for the next flush", {}, transcripts["pending"]
+    yield "transcript_write_errors_total", "counter", "Failed transcript log or rollup writes", {}, transcripts["write_errors"]
+    for limiter in (provider_clients.openai_limiter, provider_clients.tts_limiter):
+        stats = limiter.stats()
+        yield "provider_active", "gauge", "Upstream calls in flight", {"provider": limiter.name}, stats["active"]
+        yield "provider_waiting", "gauge", "Calls queued for a provider slot", {"provider": limiter.name}, stats["waiting"]
+        yield "provider_overloaded_total", "counter", "Calls refused or timed out waiting for a provider slot", \
+            {"provider": limiter.name}, stats["rejected"] + stats["timed_out"]
+    yield "knowledge_base_version", "gauge", "Current index version", {}, knowledge_base.version
+    for part, size in knowledge_base.memory_usage().items():
+        yield "knowledge_base_bytes", "gauge", "Size of the index by part (exact is kept on disk)", {"part": part}, size
+
+metrics.register(collect_runtime)
+
+async def hold_audio() -> Optional[bytes]:
+    """The pinned hold message; text only if even that can't be synthesized now"""
+    try:
+        return await synthesize_speech(HOLD_MESSAGE)
+    except PROVIDER_BUSY_ERRORS:
+        return None
+# Single versioned index; agents read whichever snapshot is current
+knowledge_base = KnowledgeBase(encoder_service, ann_threshold=KB_ANN_THRESHOLD, ann_nprobe=KB_ANN_NPROBE,
+                               dtype=KB_INDEX_DTYPE, rerank=KB_RERANK_CANDIDATES, spill_dir=KB_SPILL_DIR)
+ingest_cache = IngestCache(INGEST_CACHE_DIR)
+# Embeddings and top-k results of repeated utterances, per index version
+query_cache = QueryCache(QUERY_CACHE_SIZE)
+knowledge_store_lock = threading.Lock()
+base_bundle_id: Optional[str] = None
+# Sessions and the shared prompt/KB config; config_revision is the last one this worker applied
+session_store = open_session_store(SESSION_STORE_URL)
+transcript_recorder = TranscriptRecorder(TRANSCRIPT_DIR or None, flush_interval=TRANSCRIPT_FLUSH_INTERVAL)
+config_revision = 0
+config_watcher: Optional[asyncio.Task] = None
+# What a call needs before this worker should get traffic: cold -> warm | failed
+prewarm_status = {"encoder": "cold", "connections": "cold", "audio": "cold"}
+prewarm_task: Optional[asyncio.Task] = None
+# Long-lived PDF extraction pool (created at startup, workers start on first use)
+pdf_pool = None
 
 # Add CORS middleware
 app.add_middleware(
@@ -42,38 +226,247 @@ app.add_middleware(
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+def load_knowledge_store():
+    """Map the persisted knowledge base (and its prompt) so restarts don't need a re-upload.
+
+    A prebuilt bundle (KB_BUNDLE_DIR) wins unless the store was built on top of
+    that same bundle, i.e. it holds the bundle plus later uploads.
+    """
+    global current_sales_prompt, base_bundle_id
+    loaded = load_snapshot(KB_STORE_DIR)
+    if KB_BUNDLE_DIR:
+        bundle = load_snapshot(KB_BUNDLE_DIR)
+        if bundle is None:
+            print(f"No knowledge base bundle found in {KB_BUNDLE_DIR}")
+        elif loaded is None or loaded[1].get("base_bundle") != bundle[1].get("bundle_id"):
+            loaded = bundle
+        base_bundle_id = bundle[1].get("bundle_id") if bundle else None
+    if loaded is None:
+        return
+    snapshot, manifest = loaded
+    knowledge_base.adopt(snapshot)
+    if manifest.get("prompt"):
+        current_sales_prompt = manifest["prompt"]
+
+def persist_knowledge_store(prompt: str) -> str:
+    with knowledge_store_lock:
+        return save_snapshot(knowledge_base.snapshot, KB_STORE_DIR, dtype=KB_STORE_DTYPE, keep=KB_STORE_KEEP_VERSIONS,
+                             extra={"prompt": prompt, "base_bundle": base_bundle_id})
+
+def apply_prompt(prompt: str):
+    """Make `prompt` current; live calls restart their conversation with it"""
+    global current_sales_prompt
+    current_sales_prompt = prompt
+    for agent in ai_agents.values():
+        agent.system_prompt = prompt
+        agent.history.reset(prompt)
+
+async def publish_config(prompt: str, store_dir: str):
+    """Tell the other workers that the prompt and knowledge base changed"""
+    global config_revision
+    config = {"prompt": prompt, "kb_version": knowledge_base.version, "kb_store": os.path.basename(store_dir)}
+    config_revision = await asyncio.to_thread(session_store.publish_config, config)
+    print(f"Published config revision {config_revision} (knowledge base v{knowledge_base.version})")
+
+async def apply_config(config: dict):
+    """Pick up a prompt/knowledge base published by another worker from the shared store"""
+    if config.get("kb_version") != knowledge_base.version:
+        # The exact version that was published: CURRENT may already point at a later one
+        loaded = await run_in_threadpool(load_snapshot, KB_STORE_DIR, config.get("kb_store"))
+        if loaded is not None:
+            # Waits on the write lock and may re-quantize the whole matrix
+            await run_in_threadpool(knowledge_base.adopt, loaded[0])
+    if config.get("prompt") and config["prompt"] != current_sales_prompt:
+        apply_prompt(config["prompt"])
+
+async def watch_config():
+    global config_revision
+    last_purge = 0.0
+    while True:
+        await asyncio.sleep(CONFIG_POLL_INTERVAL)
+        try:
+            revision, config = await asyncio.to_thread(session_store.config)
+            if revision != config_revision and config:
+                print(f"Applying config revision {revision} from another worker")
+                config_revision = revision
+                await apply_config(config)
+            if time.time() - last_purge > 60:
+                last_purge = time.time()
+                await asyncio.to_thread(session_store.purge_sessions, last_purge - SESSION_TTL)
+        except Exception as e:
+            print(f"Error watching shared config: {str(e)}")
+
+async def save_session(agent: "AI_SalesAgent"):
+    try:
+        await asyncio.to_thread(session_store.save_session, agent.session_id, agent.to_state())
+    except Exception as e:
+        print(f"Error saving session {agent.session_id}: {str(e)}")
+
+async def end_session(agent: "AI_SalesAgent"):
+    try:
+        await asyncio.to_thread(session_store.delete_session, agent.session_id)
+    except Exception as e:
+        print(f"Error deleting session {agent.session_id}: {str(e)}")
+
+async def wait_for_encoder():
+    while not await encoder_service.wait_ready(1):
+        if encoder_service.load_error:
+            raise encoder_service.load_error
+
+async def prewarm_audio():
+    failed = await audio_cache.prewarm(STATIC_PHRASES, TTS_VOICE, TTS_MODEL, synthesize_uncached)
+    if failed:
+        raise RuntimeError(f"{failed} static phrases not synthesized")
+
+async def prewarm():
+    """Warm the encoder, provider connections and static audio in parallel.
+
+    A failed connection or audio prewarm still leaves the worker usable (first
+    calls just pay for it), so only the encoder has to be warm for readiness.
+    """
+    started = time.perf_counter()
+
+    async def step(name, warm):
+        step_started = time.perf_counter()
+        try:
+            await warm()
+            prewarm_status[name] = "warm"
+        except Exception as e:
+            prewarm_status[name] = "failed"
+            print(f"Prewarm of {name} failed: {str(e)}")
+        elapsed = time.perf_counter() - step_started
+        metrics.observe("stage_seconds", elapsed, stage=f"prewarm_{name}")
+        print(f"Prewarm {name}: {prewarm_status[name]} in {elapsed:.2f}s")
+
+    await asyncio.gather(
+        step("encoder", wait_for_encoder),
+        step("connections", lambda: provider_clients.prewarm(PROVIDER_PREWARM_CONNECTIONS)),
+        step("audio", prewarm_audio),
+    )
+    print(f"Prewarm finished in {time.perf_counter() - started:.2f}s: {prewarm_status}")
+
+def is_warm() -> bool:
+    return prewarm_task is not None and prewarm_task.done() and prewarm_status["encoder"] == "warm"
+
+async def startup():
+    global config_revision, config_watcher, prewarm_task, pdf_pool
+    started = time.perf_counter()
+    load_knowledge_store()
+    # The store already reflects everything published so far
+    config_revision = session_store.config()[0]
+    config_watcher = asyncio.create_task(watch_config())
+    encoder_service.start()
+    embedding_batcher.start()
+    pdf_pool = create_pool(PDF_EXTRACT_WORKERS)
+    provider_clients.start()
+    transcript_recorder.start()
+    # Serve health checks right away; the orchestrator routes calls once /health/ready says warm
+    prewarm_task = asyncio.create_task(prewarm())
+    print(f"Startup finished in {time.perf_counter() - started:.2f}s, prewarming in the background")
+
+async def shutdown():
+    for task in (config_watcher, prewarm_task):
+        if task:
+            task.cancel()
+    await embedding_batcher.stop()
+    await provider_clients.aclose()
+    await transcript_recorder.stop()
+    encoder_service.shutdown()
+    if pdf_pool is not None:
+        pdf_pool.shutdown(wait=False, cancel_futures=True)
+    session_store.close()
+
+@app.get("/health")
+async def health():
+    warm = is_warm()
+    return JSONResponse(
+        {
+            "status": "ok" if warm else "loading",
+            "warm": warm,
+            "prewarm": prewarm_status,
+            "encoder_ready": encoder_service.ready,
+            "embedding_batcher": embedding_batcher.stats(),
+            "query_cache": query_cache.stats(),
+            "audio_cache": audio_cache.stats(),
+            "sessions": session_gate.stats(),
+            "transcripts": transcript_recorder.stats(),
+            "config_revision": config_revision,
+            "providers": {
+                "openai": provider_clients.openai_limiter.stats(),
+                "elevenlabs": provider_clients.tts_limiter.stats()
+            }
+        },
+        status_code=200 if warm else 503
+    )
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and serving (warm or not)"""
+    return JSONResponse({"status": "ok"})
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: only warm workers should be sent calls"""
+    warm = is_warm()
+    return JSONResponse(
+        {"status": "warm" if warm else "cold", "prewarm": prewarm_status},
+        status_code=200 if warm else 503
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def read_index():
     return FileResponse('index.html')
 
+def extract_and_encode(content: bytes) -> Optional[tuple]:
+    """Extract a PDF and encode its chunks while the remaining pages are still being extracted.
+
+    Pages arrive from the extraction pool in completion order; each is chunked
+    on arrival (chunks never span pages) and every full batch is encoded while
+    the pool keeps working. Returns (pages, chunks, page_numbers, embeddings) in
+    page order, exactly as chunking the finished document would, or None if the
+    PDF has no text.
+    """
+    pages = {}
+    rows = []  # (page number, position on the page, chunk)
+    batches = []
+    encoded = 0
+    encode_seconds = 0.0
+
+    def encode_pending(minimum: int):
+        nonlocal encoded, encode_seconds
+        while len(rows) - encoded >= max(minimum, 1):
+            batch = rows[encoded:encoded + knowledge_base.batch_size]
+            started = time.perf_counter()
+            batches.append(knowledge_base.encode_chunks([chunk for _, _, chunk in batch]))
+            encode_seconds += time.perf_counter() - started
+            encoded += len(batch)
+
+    for page_number, text in iter_pdf_pages(content, PDF_EXTRACT_WORKERS, pool=pdf_pool):
+        pages[page_number] = text
+        if text.strip():
+            rows.extend((page_number, i, chunk) for i, chunk in enumerate(split_into_chunks(text)))
+        encode_pending(knowledge_base.batch_size)
+    encode_pending(1)
+
+    page_list = [pages[i] for i in range(1, len(pages) + 1)]
+    if not rows:
+        print("Warning: No text extracted from PDF")
+        return None
+    metrics.observe("stage_seconds", encode_seconds, stage="ingest_embed")
+    order = sorted(range(len(rows)), key=lambda i: rows[i][:2])
+    embeddings = np.vstack(batches)[order]
+    print(f"Extracted {sum(len(page) for page in page_list)} characters from {len(page_list)} pages, "
+          f"{len(rows)} chunks encoded in {encode_seconds:.2f}s")
+    return page_list, [rows[i][2] for i in order], [rows[i][0] for i in order], embeddings
+
 class PDFProcessor:
     def __init__(self, api_key):
         self.client = OpenAI(api_key=api_key)
 
-    def extract_text_from_pdf(self, file_content: bytes) -> Optional[str]:
-        """Extract text directly from PDF file content"""
-        try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            text = ""
-            print(f"Processing PDF with {len(pdf_reader.pages)} pages")
-            
-            for i, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                text += page_text
-                print(f"Page {i+1} extracted text length: {len(page_text)} characters")
-            
-            if not text.strip():
-                print("Warning: No text extracted from PDF")
-                return None
-                
-            print(f"Total extracted text length: {len(text)} characters")
-            print("First 500 characters of extracted text:", text[:500])
-            return text
-            
-        except Exception as e:
-            print(f"Error extracting PDF text: {str(e)}")
-            return None
-
     def create_sales_prompt(self, company_info: dict) -> str:
         try:
             print("Creating sales prompt from structured info:", json.dumps(company_info, indent=2))
@@ -179,14 +572,19 @@ If user not specified date but say "Tomorrow", "Day After Tomorrow", "Next <DAY_
             print(f"Error structuring company info: {str(e)}")
             return None
 
+def prompt_digest(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
 class AI_SalesAgent:
-    def __init__(self, system_prompt=None):
+    def __init__(self, system_prompt=None, session_id: Optional[str] = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        # Kept across resumes; names the call's transcript rollup
+        self.started_at = time.time()
         self.system_prompt = system_prompt or current_sales_prompt
         print(f"Initializing AI agent with prompt: {self.system_prompt[:200]}...")
         
-        self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        self.elevenlabs_api_key = ELEVEN_LABS_API_KEY
-        self.conversation_history = [{"role": "system", "content": self.system_prompt}]
+        self.clients = provider_clients
+        self.history = ConversationHistory(self.system_prompt, max_tokens=HISTORY_MAX_TOKENS)
         self.client_entities = {
             "name": None, "email": None, "company_name": None,
             "requirements": [], "meeting_date": None,
@@ -194,142 +592,269 @@ class AI_SalesAgent:
         }
         self.end_call_detected = False
         self.end_call_confirmed = False
+        # (normalized interim text, index version, task building its context)
+        self._speculation: Optional[tuple[str, int, asyncio.Task]] = None
         
-        # Initialize RAG components
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
-        self.documents = []
-        self.embeddings = []
-        self.sources = []
-        self.page_numbers = []
-
-    def check_for_end_call(self, text: str) -> bool:
-        """Check if the input contains any end call phrases"""
-        return any(phrase.lower() in text.lower() for phrase in END_CALL_PHRASES)
-
-    def create_chunks(self, text: str, source: str, page_number: int, chunk_size: int = 300):
-        """Create chunks from text"""
-        sentences = text.split('. ')
-        current_chunk = []
-        current_length = 0
-        
-        for sentence in sentences:
-            sentence = sentence.strip() + '. '
-            sentence_length = len(sentence)
-            
-            if current_length + sentence_length > chunk_size and current_chunk:
-                chunk_text = ' '.join(current_chunk)
-                self.documents.append(chunk_text)
-                self.sources.append(source)
-                self.page_numbers.append(page_number)
-                current_chunk = [sentence]
-                current_length = sentence_length
-            else:
-                current_chunk.append(sentence)
-                current_length += sentence_length
-        
-        if current_chunk:
-            chunk_text = ' '.join(current_chunk)
-            self.documents.append(chunk_text)
-            self.sources.append(source)
-            self.page_numbers.append(page_number)
-            
-        self.embeddings = self.encoder.encode(self.documents)
+        # Shared RAG components (not copied per agent)
+        self.encoder = encoder_service
+        self.knowledge_base = knowledge_base
+
+    def to_state(self) -> dict:
+        """Compact call state for the session store (the prompt itself is shared config)"""
+        return {
+            "prompt_digest": prompt_digest(self.system_prompt),
+            "history": self.history.to_state(),
+            "entities": self.client_entities,
+            "end_call_detected": self.end_call_detected,
+            "end_call_confirmed": self.end_call_confirmed,
+            "kb_version": self.knowledge_base.version,
+            "started_at": self.started_at,
+        }
+
+    def restore(self, state: dict) -> bool:
+        """Continue a saved call; returns False if the conversation had to restart"""
+        self.client_entities.update(state["entities"])
+        self.started_at = state.get("started_at", self.started_at)
+        # A new upload since then restarts the conversation, as it does for live calls
+        if state["prompt_digest"] != prompt_digest(self.system_prompt):
+            return False
+        self.history.restore(state["history"])
+        self.end_call_detected = state["end_call_detected"]
+        self.end_call_confirmed = state["end_call_confirmed"]
+        return True
 
-    def retrieve_relevant_chunks(self, query: str, k: int = 3) -> RetrievalResult:
-        """Retrieve relevant chunks"""
-        if not self.documents:
+    async def retrieve_relevant_chunks(self, query: str, k: int = 3) -> RetrievalResult:
+        """Retrieve relevant chunks from the current knowledge base snapshot"""
+        snapshot = self.knowledge_base.snapshot
+        if not len(snapshot):
             return RetrievalResult([], [], [], [])
             
-        query_embedding = self.encoder.encode([query])[0]
-        similarities = cosine_similarity([query_embedding], self.embeddings)[0]
-        
-        top_k_indices = np.argsort(similarities)[-k:][::-1]
-        
-        return RetrievalResult(
-            chunks=[self.documents[i] for i in top_k_indices],
-            similarities=[similarities[i] for i in top_k_indices],
-            sources=[self.sources[i] for i in top_k_indices],
-            page_numbers=[self.page_numbers[i] for i in top_k_indices]
-        )
+        key = normalize_query(query)
+        cached = query_cache.get_result(key, snapshot.version, k)
+        if cached is not None:
+            return cached
 
-    async def generate_response(self, user_input: str) -> tuple[str, bytes, bool]:
-        print(f"Generating response for input: {user_input}")
+        query_embedding = query_cache.get_embedding(key)
+        if query_embedding is None:
+            with metrics.span("encode"):
+                query_embedding = await embedding_batcher.encode(key or query)
+            query_cache.put_embedding(key, query_embedding)
+        with metrics.span("search"):
+            result = await run_in_threadpool(snapshot.search, query_embedding, k)
+        query_cache.put_result(key, snapshot.version, k, result)
+        return result
+
+    def _control_reply(self, user_input: str) -> Optional[tuple[str, bool]]:
+        """Handle the end-call flow; returns (reply, end_call) if this turn is a control turn"""
+        intent = intent_router.route(user_input, self.end_call_detected)
+        if intent:
+            print(f"Intent router: {intent} for input: {user_input!r}")
+
+        if intent == CONFIRM_END:
+            self.end_call_confirmed = True
+            return FAREWELL, True
+        if intent == END_CALL:
+            self.end_call_detected = True
+            return END_CALL_CONFIRMATION, False
+        if intent == CANCEL_END:
+            self.end_call_detected = False
+            return CONTINUE_CALL, False
+        if intent == RESUME:
+            # The caller moved on to something else instead of confirming
+            self.end_call_detected = False
+        return None
+
+    def speculate(self, partial_text: str):
+        """Start retrieval for an interim transcript so the final turn can skip it"""
+        key = normalize_query(partial_text)
+        if len(key) < SPECULATIVE_MIN_CHARS or self.end_call_detected or intent_router.is_end_call(partial_text):
+            return
+        if self._speculation and self._speculation[0] == key:
+            return
+        self.cancel_speculation()
+        task = asyncio.create_task(self._build_context(partial_text))
+        self._speculation = (key, self.knowledge_base.version, task)
+
+    def cancel_speculation(self):
+        if self._speculation:
+            task = self._speculation[2]
+            task.cancel()
+            if task.done() and not task.cancelled():
+                # Mark a failed speculation as seen
+                task.exception()
+            self._speculation = None
+
+    async def _take_speculation(self, user_input: str) -> Optional[str]:
+        """Context prepared from the interim transcript, if it matches the final one"""
+        if not self._speculation:
+            return None
+        key, version, task = self._speculation
+        self._speculation = None
+        if key != normalize_query(user_input) or version != self.knowledge_base.version:
+            task.cancel()
+            metrics.inc("speculation_total", outcome="discarded")
+            print(f"Discarded speculative retrieval for: {key}")
+            return None
         try:
-            # Handle end call confirmation
-            if self.end_call_detected and ("yes" in user_input.lower() or "okay" in user_input.lower() or "sure" in user_input.lower()):
-                self.end_call_confirmed = True
-                farewell = "Thank you for your time. Have a great day! Goodbye!"
-                audio_data = generate(
-                    api_key=self.elevenlabs_api_key,
-                    text=farewell,
-                    voice="Aria",
-                    model="eleven_flash_v2_5"
-                )
-                return farewell, audio_data, True
-            
-            # Check for end call request
-            if self.check_for_end_call(user_input) and not self.end_call_detected:
-                self.end_call_detected = True
-                confirmation_msg = "Would you like to end our conversation?"
-                audio_data = generate(
-                    api_key=self.elevenlabs_api_key,
-                    text=confirmation_msg,
-                    voice="Aria",
-                    model="eleven_flash_v2_5"
-                )
-                return confirmation_msg, audio_data, False
-            
-            # Reset end_call_detected if user continues conversation
-            if self.end_call_detected and ("no" in user_input.lower() or "continue" in user_input.lower()):
-                self.end_call_detected = False
-
-            # Retrieve relevant chunks using RAG
-            retrieved = self.retrieve_relevant_chunks(user_input)
-            context = "\n".join([f"Context {i+1}: {chunk}" 
-                               for i, chunk in enumerate(retrieved.chunks)])
-            
-            # Add context to the conversation
-            enhanced_input = f"""User Input: {user_input}
+            context = await task
+        except Exception as e:
+            metrics.inc("speculation_total", outcome="failed")
+            print(f"Speculative retrieval failed: {str(e)}")
+            return None
+        metrics.inc("speculation_total", outcome="reused")
+        print(f"Reused speculative retrieval for: {key}")
+        return context
+
+    async def _build_context(self, query: str) -> str:
+        # Retrieve relevant chunks using RAG
+        retrieved = await self.retrieve_relevant_chunks(query)
+        context = "\n".join([f"Context {i+1}: {chunk}" 
+                           for i, chunk in enumerate(retrieved.chunks)])
+        return f"""Retrieved Context:
+{context}"""
 
-Retrieved Context:
-{context}
+    async def _prepare_turn(self, user_input: str) -> List[dict]:
+        """Record the user turn and build this turn's request messages"""
+        # Recorded before the first await so an interrupted turn still keeps what the caller said
+        self.history.add("user", user_input)
+
+        # Only the part the caller waits for: ~0 when speculation already did it
+        with metrics.span("retrieval"):
+            context = await self._take_speculation(user_input)
+            if context is None:
+                context = await self._build_context(user_input)
+        
+        # Context and entities go with this turn only; history keeps the raw text
+        turn_context = f"""{context}
 
 Current Entities Tracked:
-{json.dumps(self.client_entities, indent=2)}"""
+{json.dumps(self.client_entities)}"""
 
-            self.conversation_history.append({"role": "user", "content": enhanced_input})
+        return self.history.messages(turn_context)
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=self.conversation_history,
-                temperature=0.7,
-                max_tokens=150
-            )
+    def _finish_turn(self, response_text: str) -> str:
+        """Track entities from the completion and record the spoken reply"""
+        spoken_response, entities = self.extract_entities(response_text)
+        if entities:
+            print("Extracted entities:", json.dumps(entities, indent=2))
+            self.update_entities(entities)
+        self.history.add("assistant", spoken_response)
+        return spoken_response
+
+    async def generate_response(self, user_input: str) -> tuple[str, bytes, bool]:
+        print(f"Generating response for input: {user_input}")
+        try:
+            control = self._control_reply(user_input)
+            if control:
+                reply, end_call = control
+                audio_data = await synthesize_speech(reply)
+                return reply, audio_data, end_call
+
+            messages = await self._prepare_turn(user_input)
+
+            async with self.clients.openai_limiter.slot():
+                with metrics.span("llm"):
+                    response = await self.clients.openai.chat.completions.create(
+                        model="gpt-4o",
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=150
+                    )
+            record_usage(response.usage)
 
             response_text = response.choices[0].message.content
             print(f"GPT response: {response_text}")
-            
-            spoken_response, entities = self.extract_entities(response_text)
-            if entities:
-                print("Extracted entities:", json.dumps(entities, indent=2))
-                self.update_entities(entities)
+            spoken_response = self._finish_turn(response_text)
 
             print("Generating audio response...")
-            audio_data = generate(
-                api_key=self.elevenlabs_api_key,
-                text=spoken_response,
-                voice="Aria",
-                model="eleven_flash_v2_5"
-            )
+            audio_data = await synthesize_speech(spoken_response)
             print("Audio response generated successfully")
 
-            self.conversation_history.append({"role": "assistant", "content": spoken_response})
             return spoken_response, audio_data, self.end_call_detected
 
+        except PROVIDER_BUSY_ERRORS as e:
+            print(f"Provider busy, sending hold message: {str(e)}")
+            return HOLD_MESSAGE, await hold_audio(), False
         except Exception as e:
             print(f"Error generating response: {str(e)}")
             return None, None, False
 
+    async def stream_response(self, user_input: str) -> AsyncIterator[ResponseChunk]:
+        """Streamed turn: sentences are sent to TTS while gpt-4o is still generating.
+
+        Yields one ResponseChunk per voiced sentence, in order, then a final chunk
+        with the full spoken text and the end_call flag.
+        """
+        print(f"Streaming response for input: {user_input}")
+        control = self._control_reply(user_input)
+        if control:
+            reply, end_call = control
+            audio_data = await synthesize_speech(reply)
+            yield ResponseChunk(0, reply, audio_data)
+            yield ResponseChunk(1, reply, final=True, end_call=end_call)
+            return
+
+        messages = await self._prepare_turn(user_input)
+
+        splitter = SentenceSplitter()
+        queue: asyncio.Queue = asyncio.Queue()
+        tts_tasks = []
+
+        def enqueue(sentences):
+            for sentence in sentences:
+                task = asyncio.create_task(synthesize_speech(sentence))
+                tts_tasks.append(task)
+                queue.put_nowait((sentence, task))
+
+        async def produce():
+            try:
+                # The slot is held until the whole completion has streamed
+                async with self.clients.openai_limiter.slot():
+                    started = time.perf_counter()
+                    first_token = True
+                    with metrics.span("llm"):
+                        stream = await self.clients.openai.chat.completions.create(
+                            model="gpt-4o",
+                            messages=messages,
+                            temperature=0.7,
+                            max_tokens=150,
+                            stream=True,
+                            stream_options={"include_usage": True}
+                        )
+                        async for event in stream:
+                            if event.choices and event.choices[0].delta.content:
+                                if first_token:
+                                    metrics.observe("stage_seconds", time.perf_counter() - started, stage="llm_first_token")
+                                    first_token = False
+                                enqueue(splitter.feed(event.choices[0].delta.content))
+                            # With include_usage the last event carries the token counts
+                            record_usage(getattr(event, "usage", None))
+                enqueue(splitter.flush())
+            finally:
+                queue.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        seq = 0
+        try:
+            while (item := await queue.get()) is not None:
+                sentence, task = item
+                yield ResponseChunk(seq, sentence, await task)
+                seq += 1
+            await producer
+        except PROVIDER_BUSY_ERRORS as e:
+            print(f"Provider busy, sending hold message: {str(e)}")
+            yield ResponseChunk(seq, HOLD_MESSAGE, await hold_audio())
+            yield ResponseChunk(seq + 1, HOLD_MESSAGE, final=True)
+            return
+        finally:
+            producer.cancel()
+            for task in tts_tasks:
+                task.cancel()
+
+        print(f"GPT response: {splitter.text}")
+        spoken_response = self._finish_turn(splitter.text)
+        yield ResponseChunk(seq, spoken_response, final=True, end_call=self.end_call_detected)
+
     def extract_entities(self, response_text: str) -> tuple[str, Optional[dict]]:
         print("Extracting entities from response:", response_text)
         parts = response_text.split("[[ENTITIES]]")
@@ -350,6 +875,7 @@ Current Entities Tracked:
         for key, value in entities.items():
             if value is not None:
                 self.client_entities[key] = value
+        transcript_recorder.record(self.session_id, "entities", entities=self.client_entities)
         print("Updated client entities:", json.dumps(self.client_entities, indent=2))
 
 current_sales_prompt = "You are an AI sales agent. Your role is to understand client needs and guide them toward our solutions. Please be professional and courteous."
@@ -358,51 +884,101 @@ ai_agents: Dict[str, AI_SalesAgent] = {}
 @app.post("/upload_knowledge")
 async def upload_knowledge(file: UploadFile = File(...)):
     print(f"Received file upload: {file.filename}")
-    global current_sales_prompt
+    started = time.perf_counter()
     
     try:
         content = await file.read()
         print(f"Read file content: {len(content)} bytes")
         
         pdf_processor = PDFProcessor(OPENAI_API_KEY)
+        # Every stage below is memoized on the file's content hash
+        digest = await run_in_threadpool(ingest_cache.digest, content)
         
-        # Extract text from PDF
-        pdf_text = pdf_processor.extract_text_from_pdf(content)
-        if not pdf_text:
-            print("Failed to extract text from PDF")
-            return JSONResponse(
-                {"status": "error", "message": "Failed to extract text from PDF"},
-                status_code=400
-            )
+        # Extract text from PDF (a new document is chunked and encoded as its pages come in)
+        pages = await run_in_threadpool(ingest_cache.load_json, digest, "pages")
+        streamed = None
+        if pages is None:
+            with metrics.span("ingest_extract"):
+                try:
+                    streamed = await run_in_threadpool(extract_and_encode, content)
+                except Exception as e:
+                    print(f"Error extracting PDF text: {str(e)}")
+            if not streamed:
+                print("Failed to extract text from PDF")
+                return JSONResponse(
+                    {"status": "error", "message": "Failed to extract text from PDF"},
+                    status_code=400
+                )
+            pages = streamed[0]
+            await run_in_threadpool(ingest_cache.save_json, digest, "pages", pages)
+        else:
+            print(f"Using cached text for {digest[:12]} ({len(pages)} pages)")
+        pdf_text = "".join(pages)
         
         # Structure the company information
-        structured_info = pdf_processor.structure_company_info(pdf_text)
-        if not structured_info:
-            print("Failed to structure company information")
-            return JSONResponse(
-                {"status": "error", "message": "Failed to structure company information"},
-                status_code=400
-            )
+        structured_info = await run_in_threadpool(ingest_cache.load_json, digest, "structured")
+        if structured_info is None:
+            with metrics.span("ingest_structure"):
+                structured_info = await run_in_threadpool(pdf_processor.structure_company_info, pdf_text)
+            if not structured_info:
+                print("Failed to structure company information")
+                return JSONResponse(
+                    {"status": "error", "message": "Failed to structure company information"},
+                    status_code=400
+                )
+            await run_in_threadpool(ingest_cache.save_json, digest, "structured", structured_info)
+        else:
+            print(f"Using cached company information for {digest[:12]}")
         
-        # Create and store sales prompt globally
-        sales_prompt = pdf_processor.create_sales_prompt(structured_info)
-        if not sales_prompt:
-            print("Failed to create sales prompt")
-            return JSONResponse(
-                {"status": "error", "message": "Failed to create sales prompt"},
-                status_code=400
-            )
+        # Create and store sales prompt globally (it embeds today's date, so only reuse it the same day)
+        today = datetime.now().strftime("%d-%m-%Y")
+        cached_prompt = await run_in_threadpool(ingest_cache.load_json, digest, "prompt")
+        if cached_prompt and cached_prompt.get("date") == today:
+            sales_prompt = cached_prompt["prompt"]
+        else:
+            sales_prompt = pdf_processor.create_sales_prompt(structured_info)
+            if not sales_prompt:
+                print("Failed to create sales prompt")
+                return JSONResponse(
+                    {"status": "error", "message": "Failed to create sales prompt"},
+                    status_code=400
+                )
+            await run_in_threadpool(ingest_cache.save_json, digest, "prompt",
+                                    {"date": today, "prompt": sales_prompt})
         
-        current_sales_prompt = sales_prompt
         print("Successfully processed PDF and created sales prompt")
         
-        # Update existing AI agents with new prompt and RAG content
-        for agent in ai_agents.values():
-            agent.system_prompt = current_sales_prompt
-            agent.conversation_history = [{"role": "system", "content": current_sales_prompt}]
-            # Process the PDF text for RAG
-            agent.create_chunks(pdf_text, file.filename, 1)
-        
+        # Index the PDF once; every agent (live or future) sees the new version
+        index_name = f"page-index-{ENCODER_MODEL_NAME.replace('/', '_')}"
+        if streamed is not None:
+            _, chunks, page_numbers, embeddings = streamed
+            await run_in_threadpool(ingest_cache.save_json, digest, index_name,
+                                    {"chunks": chunks, "page_numbers": page_numbers})
+            await run_in_threadpool(ingest_cache.save_array, digest, index_name, embeddings)
+        else:
+            cached_chunks = await run_in_threadpool(ingest_cache.load_json, digest, index_name)
+            embeddings = await run_in_threadpool(ingest_cache.load_array, digest, index_name)
+            if cached_chunks is None or embeddings is None or len(cached_chunks["chunks"]) != len(embeddings):
+                chunks, page_numbers = split_pages_into_chunks(enumerate(pages, start=1))
+                with metrics.span("ingest_embed"):
+                    embeddings = await run_in_threadpool(knowledge_base.encode_chunks, chunks)
+                await run_in_threadpool(ingest_cache.save_json, digest, index_name,
+                                    {"chunks": chunks, "page_numbers": page_numbers})
+                await run_in_threadpool(ingest_cache.save_array, digest, index_name, embeddings)
+            else:
+                chunks, page_numbers = cached_chunks["chunks"], cached_chunks["page_numbers"]
+                print(f"Using cached embeddings for {digest[:12]} ({len(chunks)} chunks)")
+        with metrics.span("ingest_index"):
+            await run_in_threadpool(knowledge_base.add_chunks, chunks, embeddings, file.filename,
+                                    page_numbers, True)
+        with metrics.span("ingest_persist"):
+            store_dir = await run_in_threadpool(persist_knowledge_store, sales_prompt)
+
+        # Update existing AI agents with new prompt, here and on every other worker
+        apply_prompt(sales_prompt)
+        await publish_config(sales_prompt, store_dir)
+
+        metrics.observe("stage_seconds", time.perf_counter() - started, stage="ingest")
         return JSONResponse({
             "status": "success",
             "prompt": sales_prompt
@@ -415,76 +991,266 @@ async def upload_knowledge(file: UploadFile = File(...)):
             status_code=500
         )
 
+class ResponseSender:
+    """Sends agent replies in the audio protocol the client negotiated on /ws.
+
+    Binary mode (?audio=binary): a small JSON control frame with the text, seq
+    and end_call flag, followed by the raw audio in a binary frame when
+    `audio_frame` is true. JSON mode (default, for old clients): the audio is
+    base64-encoded inside the JSON message.
+
+    A control frame and its audio always go out together, even if the turn that
+    sent them is cancelled halfway, so the client never pairs audio with the
+    wrong message.
+    """
+
+    def __init__(self, websocket: WebSocket, binary: bool):
+        self.websocket = websocket
+        self.binary = binary
+        self._lock = asyncio.Lock()
+
+    async def send(self, message: dict, audio: Optional[bytes] = None):
+        await asyncio.shield(self._send(message, audio))
+
+    async def _send(self, message: dict, audio: Optional[bytes]):
+        async with self._lock:
+            with metrics.span("ws_send"):
+                if audio:
+                    metrics.inc("audio_bytes_total", len(audio), direction="sent")
+                if self.binary:
+                    message["audio_frame"] = bool(audio)
+                    await self.websocket.send_json(message)
+                    if audio:
+                        await self.websocket.send_bytes(audio)
+                else:
+                    message["audio"] = base64.b64encode(audio).decode('utf-8') if audio else None
+                    await self.websocket.send_json(message)
+
+async def run_turn(ai_agent: AI_SalesAgent, sender: ResponseSender, streaming: bool, turn: int,
+                   trace_id: str, text: str, replied: asyncio.Event):
+    """Answer one caller message, closing the socket once a farewell is sent.
+
+    Runs as its own task so a newer message (barge-in) can cancel it, which
+    aborts the completion and any TTS still in flight. `replied` is set once
+    the last frame is sent; from then on the turn is only bookkeeping and is
+    left to finish. Every frame carries the turn id so the client can drop
+    anything from a turn it has interrupted, and the trace id it echoes back
+    with its own timings.
+    """
+    started = time.perf_counter()
+    first_audio = True
+    end_call = False
+    reply_text = None
+    transcript_recorder.record(ai_agent.session_id, "turn", role="user", text=text, turn=turn, trace_id=trace_id)
+
+    async def send(message: dict, audio: Optional[bytes] = None):
+        nonlocal first_audio
+        message["turn"] = turn
+        message["trace_id"] = trace_id
+        await sender.send(message, audio)
+        if audio and first_audio:
+            first_audio = False
+            metrics.observe("stage_seconds", time.perf_counter() - started, stage="first_audio")
+
+    try:
+        if streaming:
+            print(f"[{trace_id}] Processing message (streaming): {text}")
+            try:
+                async for chunk in ai_agent.stream_response(text):
+                    if chunk.final:
+                        end_call, reply_text = chunk.end_call, chunk.text
+                        await send({
+                            "type": "ai_response_end",
+                            "seq": chunk.seq,
+                            "text": chunk.text,
+                            "end_call": chunk.end_call
+                        })
+                    else:
+                        await send({
+                            "type": "ai_response_chunk",
+                            "seq": chunk.seq,
+                            "text": chunk.text
+                        }, chunk.audio)
+            except Exception as e:
+                print(f"[{trace_id}] Error streaming response: {str(e)}")
+                metrics.inc("turns_total", outcome="failed")
+                return
+        else:
+            print(f"[{trace_id}] Processing message: {text}")
+            response_text, response_audio, end_call = await ai_agent.generate_response(text)
+            if not response_text:
+                metrics.inc("turns_total", outcome="failed")
+                return
+            print(f"[{trace_id}] Sending response: {response_text}")
+            reply_text = response_text
+            await send({
+                "type": "ai_response",
+                "seq": 0,
+                "text": response_text,
+                "end_call": end_call
+            }, response_audio)
+    except asyncio.CancelledError:
+        metrics.inc("turns_total", outcome="interrupted")
+        raise
+
+    replied.set()
+    metrics.inc("turns_total", outcome="completed")
+    # Only replies that were sent in full; an interrupted one stays out of the transcript
+    if reply_text:
+        transcript_recorder.record(ai_agent.session_id, "turn", role="assistant", text=reply_text, turn=turn,
+                                   trace_id=trace_id)
+    metrics.observe("stage_seconds", time.perf_counter() - started, stage="turn")
+    if end_call:
+        # The receive loop sees the disconnect and cleans up the session
+        await end_session(ai_agent)
+        await sender.websocket.close()
+    else:
+        await save_session(ai_agent)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     print("New WebSocket connection request")
     await websocket.accept()
     print("WebSocket connection accepted")
     
-    connection_id = str(id(websocket))
-    
+    # A reconnecting caller (possibly landing on another worker) continues its saved call
+    requested = websocket.query_params.get("session")
+    saved = None
+    if requested and requested not in ai_agents:
+        saved = await asyncio.to_thread(session_store.load_session, requested)
+    connection_id = requested if saved else uuid.uuid4().hex
+    # Streaming clients get the reply sentence by sentence instead of as one clip
+    streaming = websocket.query_params.get("mode") == "stream"
+    sender = ResponseSender(websocket, binary=websocket.query_params.get("audio") == "binary")
+
+    # Queue the call until the shared encoder is warm, refuse it if it never gets there
+    if not await encoder_service.wait_ready(ENCODER_READY_TIMEOUT):
+        print(f"Encoder not ready, refusing connection {connection_id}")
+        await websocket.close(code=1013, reason="Server is warming up, try again shortly")
+        return
+
+    # Admission control: past the cap a caller is told to retry rather than joining an overloaded worker
+    if not session_gate.try_enter():
+        print(f"Session limit reached, refusing connection {connection_id}")
+        await websocket.close(code=1013, reason="Too many calls right now, try again shortly")
+        return
+
+    turn = 0
+    turn_task: Optional[asyncio.Task] = None
+    turn_replied = asyncio.Event()
+
+    async def cancel_turn():
+        # Barge-in: drop the reply in progress before handling what the caller said
+        if not turn_task or turn_task.done():
+            return
+        if turn_replied.is_set():
+            # Already answered: let it finish recording and saving the turn instead
+            await asyncio.wait([turn_task])
+            return
+        turn_task.cancel()
+        await asyncio.wait([turn_task])
+        print(f"Interrupted turn {turn} for connection {connection_id}")
+
     try:
         # Create new AI agent for this connection
-        ai_agents[connection_id] = AI_SalesAgent(system_prompt=current_sales_prompt)
+        ai_agents[connection_id] = AI_SalesAgent(system_prompt=current_sales_prompt, session_id=connection_id)
         print(f"Created new AI agent for connection {connection_id} with current sales prompt")
+        resumed = saved is not None and ai_agents[connection_id].restore(saved)
+        if resumed:
+            print(f"Resumed saved session {connection_id}")
 
-        # Send initial greeting and add to conversation history
-        greeting = "Hello! I'm calling from Toshal Infotech. I'd love to discuss how our services could benefit your business. Is this a good time to talk?"
-        audio_data = generate(
-            api_key=ELEVEN_LABS_API_KEY,
-            text=greeting,
-            voice="Aria",
-            model="eleven_flash_v2_5"
-        )
-        
-        # Add greeting to conversation history
-        ai_agents[connection_id].conversation_history.append({
-            "role": "assistant", 
-            "content": greeting
-        })
-        
-        # Send greeting to client
-        await websocket.send_json({
-            "type": "ai_response",
-            "text": greeting,
-            "audio": base64.b64encode(audio_data).decode('utf-8') if audio_data else None,
-            "end_call": False
-        })
+        # The client reconnects with ?session=<id> to continue this call
+        await sender.send({"type": "session", "session_id": connection_id, "resumed": resumed})
+
+        if not resumed:
+            # Send initial greeting and add to conversation history
+            greeting = GREETING
+            audio_data = await synthesize_speech(greeting)
+            
+            # Add greeting to conversation history
+            ai_agents[connection_id].history.add("assistant", greeting)
+            transcript_recorder.record(connection_id, "turn", role="assistant", text=greeting, turn=turn)
+            
+            # Send greeting to client
+            await sender.send({
+                "type": "ai_response",
+                "turn": turn,
+                "trace_id": uuid.uuid4().hex[:16],
+                "seq": 0,
+                "text": greeting,
+                "end_call": False
+            }, audio_data)
 
-        # Main conversation loop
+        # Main conversation loop; replies run in the background so new input can interrupt them
         while True:
             data = await websocket.receive_json()
             print(f"Received WebSocket data: {json.dumps(data, indent=2)}")
             
             ai_agent = ai_agents[connection_id]
-            
-            if data["action"] == "message":
-                print(f"Processing message: {data['text']}")
-                response_text, response_audio, end_call = await ai_agent.generate_response(data["text"])
-                
-                if response_text:
-                    print(f"Sending response: {response_text}")
-                    await websocket.send_json({
-                        "type": "ai_response",
-                        "text": response_text,
-                        "audio": base64.b64encode(response_audio).decode('utf-8') if response_audio else None,
-                        "end_call": end_call
-                    })
-                    
-                    if end_call:
-                        await websocket.close()
-                        if connection_id in ai_agents:
-                            del ai_agents[connection_id]
-                        break
+
+            # A malformed frame is dropped, never allowed to end the call
+            if not isinstance(data, dict):
+                print(f"Ignoring malformed frame for connection {connection_id}: {data!r}")
+                continue
+            text = data.get("text")
+            if data.get("action") in ("partial", "message") and not isinstance(text, str):
+                print(f"Ignoring {data.get('action')} without text for connection {connection_id}: {text!r}")
+                continue
+
+            # The client echoes the trace id of the reply it was hearing
+            if data.get("trace_id"):
+                print(f"[{data['trace_id']}] Client {data.get('action')} for connection {connection_id}")
+
+            if data.get("action") == "partial":
+                # Interim transcript: warm up retrieval for the turn that's probably coming
+                ai_agent.speculate(text)
+
+            elif data.get("action") == "interrupt":
+                await cancel_turn()
+
+            elif data.get("action") == "timing":
+                # Client-side latency for a traced turn (speech end -> first audio played)
+                # Telemetry only: a malformed report is dropped, never allowed to end the call
+                try:
+                    first_audio_ms = float(data.get("first_audio_ms"))
+                except (TypeError, ValueError):
+                    first_audio_ms = None
+                if first_audio_ms is not None and math.isfinite(first_audio_ms) and first_audio_ms >= 0:
+                    metrics.observe("client_seconds", first_audio_ms / 1000, stage="first_audio")
+                else:
+                    print(f"Ignoring invalid timing report: {data.get('first_audio_ms')!r}")
+
+            elif data.get("action") == "message":
+                await cancel_turn()
+                turn += 1
+                turn_replied = asyncio.Event()
+                turn_task = asyncio.create_task(
+                    run_turn(ai_agent, sender, streaming, turn, uuid.uuid4().hex[:16], text, turn_replied)
+                )
+                # Let the turn route its intent and record the input before the next message can cancel it
+                await asyncio.sleep(0)
 
     except WebSocketDisconnect:
         print(f"WebSocket disconnected for connection {connection_id}")
-        if connection_id in ai_agents:
-            del ai_agents[connection_id]
     except Exception as e:
         print(f"WebSocket error for connection {connection_id}: {str(e)}")
+    finally:
+        session_gate.leave()
+        # A reply still being produced is dropped; one already sent finishes its bookkeeping
+        if turn_task and not turn_task.done() and not turn_replied.is_set():
+            turn_task.cancel()
         if connection_id in ai_agents:
-            del ai_agents[connection_id]
+            agent = ai_agents.pop(connection_id)
+            agent.cancel_speculation()
+            # Before any await: the handler may be cancelled once the socket is gone
+            transcript_recorder.close_session(agent.session_id, agent.client_entities,
+                                              "ended" if agent.end_call_confirmed else "disconnected",
+                                              started_at=agent.started_at)
+            if turn_task and not turn_task.done():
+                await asyncio.wait([turn_task])
+            # Keep the call resumable unless it ended normally
+            if not agent.end_call_confirmed:
+                await save_session(agent)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,125 @@
+"""Recall vs memory of the knowledge-base index storage modes.
+
+Indexes the same synthetic corpus (clustered, normalized 384-dim embeddings
+plus ~300-character chunk texts) as float32, float16 and int8 vectors, and
+reports each mode's resident vector bytes and its recall@k against exact
+float32 search, with and without re-ranking against the full-precision copy,
+and each mode's query latency relative to float32 (float16 saves memory but is
+upcast in software, so it is the slowest to scan).
+It also compares chunk texts and metadata held as Python lists with the same
+rows in a ChunkTable. Run from the repo root:
+
+    python benchmarks/bench_index_memory.py
+    python benchmarks/bench_index_memory.py --chunks 300000 --rerank 0 16 64 --json
+"""
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_retrieval import synthetic_corpus  # noqa: E402
+from kb_index import INDEX_DTYPES, ChunkTable, KnowledgeBase  # noqa: E402
+
+WORDS = ("software platform mobile cloud analytics security retail healthcare integration design "
+         "pricing support migration consulting delivery automation dashboard payments onboarding").split()
+
+
+def synthetic_texts(n: int, rng: np.random.Generator, words_per_chunk: int = 40):
+    words = np.array(WORDS)[rng.integers(0, len(WORDS), (n, words_per_chunk))]
+    return [" ".join(row) + "." for row in words]
+
+
+def table_memory(n: int, rng: np.random.Generator) -> dict:
+    """Bytes retained by Python lists of the chunk rows vs a ChunkTable holding them"""
+    tracemalloc.start()
+    documents = synthetic_texts(n, rng)
+    sources = [f"catalogue-{i // 2000}.pdf" for i in range(n)]
+    page_numbers = [int(p) for p in rng.integers(1, 2000, n)]
+    lists = tracemalloc.get_traced_memory()[0]
+    table = ChunkTable.from_rows(documents, sources, page_numbers)
+    table_bytes = tracemalloc.get_traced_memory()[0] - lists
+    tracemalloc.stop()
+    return {"lists_bytes": lists, "table_bytes": table_bytes, "table_rows": len(table),
+            "text_bytes": int(table.offsets.view()[-1])}
+
+
+def run_queries(snapshot, queries: np.ndarray, k: int):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(snapshot.search(q, k).chunks)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies), results
+
+
+def bench(n: int, dim: int, n_queries: int, k: int, reranks, rng: np.random.Generator) -> dict:
+    matrix = synthetic_corpus(n, dim, rng)
+    queries = synthetic_corpus(n_queries, dim, rng)
+    documents = [str(i) for i in range(n)]
+    spill_dir = tempfile.mkdtemp()
+    rows = []
+    truth = None
+    for dtype in INDEX_DTYPES:
+        # Retrieval is exact below the ANN threshold, so recall only reflects the vector storage
+        kb = KnowledgeBase(None, dtype=dtype, ann_threshold=n + 1, spill_dir=spill_dir)
+        kb.add_chunks(documents, matrix, "synthetic", [1] * n)
+        usage = kb.memory_usage()
+        for rerank in (reranks if dtype != "float32" else [0]):
+            snapshot = dataclasses.replace(kb.snapshot, rerank=rerank)
+            latencies, results = run_queries(snapshot, queries, k)
+            if truth is None:
+                truth = results
+            recall = np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)])
+            rows.append({
+                "dtype": dtype,
+                "rerank": rerank if dtype != "float32" else None,
+                "vector_bytes": usage["vectors"],
+                "exact_bytes_on_disk": usage["exact"],
+                "recall_at_k": float(recall),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+            })
+    baseline = rows[0]["p50_ms"]
+    for row in rows:
+        row["p50_vs_float32"] = row["p50_ms"] / baseline
+    return {"chunks": n, "dim": dim, "k": k, "vectors": rows, "tables": table_memory(n, rng)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 32],
+                        help="Candidates re-ranked exactly for the compact modes (0 = none)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    report = bench(args.chunks, args.dim, args.queries, args.k, args.rerank, np.random.default_rng(0))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['chunks']} chunks x {report['dim']} dims, recall@{report['k']} vs exact float32")
+    print(f"{'dtype':>8} {'rerank':>6} {'vectors MB':>10} {'recall':>7} {'p50':>9} {'p99':>9} {'p50/f32':>7}")
+    for r in report["vectors"]:
+        rerank = "-" if r["rerank"] is None else r["rerank"]
+        print(f"{r['dtype']:>8} {rerank:>6} {r['vector_bytes'] / 2**20:>10.1f} {r['recall_at_k']:>7.3f} "
+              f"{r['p50_ms']:>7.3f}ms {r['p99_ms']:>7.3f}ms {r['p50_vs_float32']:>6.1f}x")
+    print("float16 trades latency for memory: numpy upcasts it in software, so scans are slower than float32; "
+          "int8 is smaller still and stays close to float32 speed")
+    t = report["tables"]
+    print(f"chunk rows: Python lists {t['lists_bytes'] / 2**20:.1f} MB, ChunkTable {t['table_bytes'] / 2**20:.1f} MB "
+          f"({t['text_bytes'] / 2**20:.1f} MB of UTF-8 text)")
+
+
+if __name__ == "__main__":
+    main()
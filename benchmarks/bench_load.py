@@ -0,0 +1,360 @@
+"""Offline load test for app.py: simulated callers and bulk uploads, no API credits.
+
+Starts the fake OpenAI/ElevenLabs servers (benchmarks/fake_providers.py) and
+the real app in separate processes, points the app at the fakes, then:
+
+  * connects N WebSocket callers (?mode=stream&audio=binary) that walk through a
+    scripted conversation, recording time to greeting, time to first audio and
+    full turn latency for every turn;
+  * samples the app's RSS before and while all calls are connected (memory per
+    session);
+  * uploads synthetic PDFs through /upload_knowledge (ingest throughput).
+
+Results are one JSON document, so runs can be diffed. Run from the repo root:
+
+    python benchmarks/bench_load.py --callers 50 --turns 4 --uploads 5 --json load.json
+    python benchmarks/bench_load.py --stub-encoder --llm-first-token-ms 500
+
+--stub-encoder swaps the sentence-transformers model for a hashing encoder, for
+machines without the model (it also leaves encoder cost out of the numbers).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_providers import FakeProviderConfig, serve as serve_fake_providers  # noqa: E402
+
+SCRIPT = [
+    "Hi, what services does your company offer?",
+    "How much would a mobile app for our clinics cost?",
+    "Do you have experience with healthcare companies?",
+    "Could we set up a meeting next Tuesday afternoon?",
+    "My email is jane@example.com and I work at Acme Health.",
+]
+WORDS = ("software platform mobile cloud analytics security retail healthcare integration design "
+         "support pricing consulting automation migration delivery team project customer data").split()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]).tolist()
+    return {"count": len(values), "p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2),
+            "max": round(max(values), 2)}
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Minimal text-only PDF (Helvetica, one text block per page)"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)]
+        ops = ["BT", "/F1 10 Tf", "40 800 Td", "12 TL"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def synthetic_pdf(pages: int, seed: int) -> bytes:
+    # Unique text per document so the ingest cache never short-circuits an upload
+    rng = random.Random(seed)
+    return make_pdf([
+        f"Document {seed} page {p + 1}. " + " ".join(rng.choice(WORDS) for _ in range(350))
+        for p in range(pages)
+    ])
+
+
+class HashingEncoder:
+    """Stand-in for SentenceTransformer: hashed bag of words, 384 dimensions"""
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        out = np.zeros((len(texts), 384), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode()) % 384] += 1
+        return out
+
+
+def serve_app(port: int, env: Dict[str, str], stub_encoder: bool, quiet: bool):
+    """Child process: the real app, configured through its environment variables"""
+    os.environ.update(env)
+    os.chdir(REPO_ROOT)
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    import uvicorn
+    import encoder_service
+
+    if stub_encoder:
+        def load(self):
+            self._model = HashingEncoder()
+            self._mark_ready()
+        encoder_service.EncoderService.load = load
+
+    import app
+    uvicorn.run(app.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+async def receive_reply(ws) -> dict:
+    """Read one reply; returns first-audio and end times (perf_counter) and the text"""
+    first_audio = None
+    while True:
+        message = json.loads(await ws.recv())
+        if message.get("audio_frame"):
+            await ws.recv()
+            if first_audio is None:
+                first_audio = time.perf_counter()
+        if message["type"] in ("ai_response", "ai_response_end"):
+            return {"first_audio": first_audio, "end": time.perf_counter(), "text": message.get("text", ""),
+                    "end_call": message.get("end_call", False)}
+
+
+async def run_caller(url: str, turns: int, think_s: float, connected: asyncio.Event,
+                     all_connected: asyncio.Event, results: dict):
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            while json.loads(await ws.recv())["type"] != "session":
+                pass
+            greeting = await receive_reply(ws)
+            results["greeting_ms"].append(1000 * ((greeting["first_audio"] or greeting["end"]) - started))
+            connected.set()
+            # Hold every call open until all have connected, for the memory sample
+            await all_connected.wait()
+
+            script = (SCRIPT * (turns // len(SCRIPT) + 1))[:turns] + ["Thanks, bye", "yes"]
+            for text in script:
+                await asyncio.sleep(think_s * random.uniform(0.5, 1.5))
+                sent = time.perf_counter()
+                await ws.send(json.dumps({"action": "message", "text": text}))
+                reply = await receive_reply(ws)
+                kind = "control" if text in ("Thanks, bye", "yes") else "llm"
+                if reply["first_audio"] is not None:
+                    results[f"{kind}_first_audio_ms"].append(1000 * (reply["first_audio"] - sent))
+                results[f"{kind}_turn_ms"].append(1000 * (reply["end"] - sent))
+                if "one moment" in reply["text"].lower():
+                    results["hold_messages"] += 1
+                if reply["end_call"]:
+                    break
+            results["completed_calls"] += 1
+    except Exception as e:
+        results["errors"].append(f"{type(e).__name__}: {e}")
+        connected.set()
+
+
+async def run_calls(base: str, pid: int, callers: int, turns: int, think_s: float, ramp_s: float) -> dict:
+    results = {"greeting_ms": [], "llm_first_audio_ms": [], "llm_turn_ms": [], "control_first_audio_ms": [],
+               "control_turn_ms": [], "hold_messages": 0, "completed_calls": 0, "errors": []}
+    baseline = rss_kb(pid)
+    all_connected = asyncio.Event()
+    events = [asyncio.Event() for _ in range(callers)]
+    url = f"ws://{base}/ws?mode=stream&audio=binary"
+
+    started = time.perf_counter()
+    tasks = []
+    for i, event in enumerate(events):
+        tasks.append(asyncio.create_task(run_caller(url, turns, think_s, event, all_connected, results)))
+        if ramp_s:
+            await asyncio.sleep(ramp_s / callers)
+    await asyncio.gather(*(e.wait() for e in events))
+    peak = rss_kb(pid)
+    all_connected.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    connected = callers - len(results["errors"])
+    return {
+        "callers": callers,
+        "completed_calls": results["completed_calls"],
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:5],
+        "hold_messages": results["hold_messages"],
+        "duration_s": round(elapsed, 2),
+        "turns_per_s": round((len(results["llm_turn_ms"]) + len(results["control_turn_ms"])) / elapsed, 2),
+        "greeting_ms": percentiles(results["greeting_ms"]),
+        "time_to_first_audio_ms": percentiles(results["llm_first_audio_ms"]),
+        "turn_latency_ms": percentiles(results["llm_turn_ms"]),
+        "control_time_to_first_audio_ms": percentiles(results["control_first_audio_ms"]),
+        "control_turn_latency_ms": percentiles(results["control_turn_ms"]),
+        "memory": {
+            "baseline_rss_mb": round(baseline / 1024, 1) if baseline else None,
+            "connected_rss_mb": round(peak / 1024, 1) if peak else None,
+            "per_session_kb": round((peak - baseline) / connected, 1) if baseline and peak and connected else None,
+        },
+    }
+
+
+async def run_uploads(base: str, uploads: int, pages: int, concurrency: int) -> dict:
+    documents = [synthetic_pdf(pages, seed) for seed in range(uploads)]
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=600) as client:
+        async def upload(i: int, content: bytes):
+            nonlocal failures
+            async with semaphore:
+                sent = time.perf_counter()
+                response = await client.post(f"http://{base}/upload_knowledge",
+                                             files={"file": (f"synthetic-{i}.pdf", content, "application/pdf")})
+                if response.status_code == 200 and response.json().get("status") == "success":
+                    latencies.append(1000 * (time.perf_counter() - sent))
+                else:
+                    failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(upload(i, d) for i, d in enumerate(documents)))
+        elapsed = time.perf_counter() - started
+
+    done = len(latencies)
+    return {
+        "uploads": uploads,
+        "failures": failures,
+        "pages_per_upload": pages,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "uploads_per_s": round(done / elapsed, 3),
+        "pages_per_s": round(done * pages / elapsed, 2),
+        "mb_per_s": round(sum(len(d) for d in documents[:done]) / 1e6 / elapsed, 3),
+        "upload_latency_ms": percentiles(latencies),
+    }
+
+
+async def run(args, app_pid: int, base: str, providers: str) -> dict:
+    await wait_ready(f"http://{base}/health", args.startup_timeout)
+    report = {"config": vars(args)}
+    if args.callers:
+        report["calls"] = await run_calls(base, app_pid, args.callers, args.turns, args.think_ms / 1000, args.ramp_s)
+    if args.uploads:
+        report["ingest"] = await run_uploads(base, args.uploads, args.pdf_pages, args.upload_concurrency)
+    async with httpx.AsyncClient() as client:
+        report["providers"] = (await client.get(f"http://{providers}/stats")).json()
+        report["server_health"] = (await client.get(f"http://{base}/health")).json()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=4, help="scripted questions per call (plus bye/yes)")
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between turns")
+    parser.add_argument("--ramp-s", type=float, default=1.0, help="spread caller connects over this long")
+    parser.add_argument("--uploads", type=int, default=3)
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    parser.add_argument("--upload-concurrency", type=int, default=2)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=60)
+    parser.add_argument("--tts-latency-ms", type=float, default=150)
+    parser.add_argument("--audio-bytes-per-char", type=int, default=1000)
+    parser.add_argument("--stub-encoder", action="store_true", help="hashing encoder instead of the model")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--app-log", action="store_true", help="keep the app's stdout")
+    parser.add_argument("--json", metavar="PATH", help="also write the report here")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    provider_port, app_port = free_port(), free_port()
+    fake_config = FakeProviderConfig(args.llm_first_token_ms, args.llm_tokens_per_sec,
+                                     args.tts_latency_ms, args.audio_bytes_per_char)
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    env = {
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{provider_port}/v1",
+        "ELEVEN_LABS_API_KEY": "bench",
+        "ELEVEN_LABS_BASE_URL": f"http://127.0.0.1:{provider_port}",
+        "TTS_CACHE_DIR": "",
+        "INGEST_CACHE_DIR": os.path.join(workdir, "ingest_cache"),
+        "KB_STORE_DIR": os.path.join(workdir, "kb_store"),
+        "TRANSCRIPT_DIR": os.path.join(workdir, "client_conversation"),
+        "KB_BUNDLE_DIR": "",
+        "MAX_SESSIONS": str(max(200, args.callers)),
+    }
+
+    providers = ctx.Process(target=serve_fake_providers, args=(provider_port, fake_config), daemon=True)
+    server = ctx.Process(target=serve_app, args=(app_port, env, args.stub_encoder, not args.app_log), daemon=True)
+    providers.start()
+    server.start()
+    try:
+        report = asyncio.run(run(args, server.pid, f"127.0.0.1:{app_port}", f"127.0.0.1:{provider_port}"))
+    finally:
+        server.terminate()
+        providers.terminate()
+        server.join(10)
+        providers.join(10)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Per-query retrieval latency for the knowledge-base index.
+
+Builds synthetic, clustered, normalized embeddings (all-MiniLM-L6-v2 has 384
+dimensions) and times exact search against the IVF index at several corpus
+sizes. Run from the repo root:
+
+    python benchmarks/bench_retrieval.py
+    python benchmarks/bench_retrieval.py --sizes 1000 100000 --queries 200 --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_index import IVFIndex, IndexSnapshot, normalize_rows  # noqa: E402
+
+
+def synthetic_corpus(n: int, dim: int, rng: np.random.Generator, n_topics: int = 256) -> np.ndarray:
+    """Clustered unit vectors, closer to real sentence embeddings than pure noise"""
+    topics = normalize_rows(rng.standard_normal((n_topics, dim)))
+    matrix = np.empty((n, dim), dtype=np.float32)
+    block = 100000
+    for i in range(0, n, block):
+        m = min(block, n - i)
+        matrix[i:i + m] = topics[rng.integers(0, n_topics, m)] + 0.05 * rng.standard_normal((m, dim))
+    return normalize_rows(matrix)
+
+
+def time_queries(snapshot: IndexSnapshot, queries: np.ndarray, k: int):
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        result = snapshot.search(q, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(result.chunks)
+    return np.array(latencies), results
+
+
+def bench_size(n: int, dim: int, n_queries: int, k: int, nprobe: int, rng: np.random.Generator) -> dict:
+    matrix = synthetic_corpus(n, dim, rng)
+    documents = [str(i) for i in range(n)]
+    sources = ["synthetic"] * n
+    pages = [1] * n
+    queries = synthetic_corpus(n_queries, dim, rng)
+
+    exact = IndexSnapshot(1, documents, sources, pages, matrix)
+    exact_ms, exact_results = time_queries(exact, queries, k)
+
+    start = time.perf_counter()
+    ann = IVFIndex.build(matrix, nprobe=nprobe)
+    build_s = time.perf_counter() - start
+    approx = IndexSnapshot(1, documents, sources, pages, matrix, ann=ann)
+    ann_ms, ann_results = time_queries(approx, queries, k)
+
+    recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(ann_results, exact_results)])
+    return {
+        "chunks": n,
+        "exact_p50_ms": float(np.percentile(exact_ms, 50)),
+        "exact_p99_ms": float(np.percentile(exact_ms, 99)),
+        "ivf_p50_ms": float(np.percentile(ann_ms, 50)),
+        "ivf_p99_ms": float(np.percentile(ann_ms, 99)),
+        "ivf_build_s": build_s,
+        "ivf_lists": len(ann.lists),
+        "ivf_recall_at_k": float(recall),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = [bench_size(n, args.dim, args.queries, args.k, args.nprobe, rng) for n in args.sizes]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'chunks':>9} {'exact p50':>10} {'exact p99':>10} {'ivf p50':>9} {'ivf p99':>9} {'build s':>8} {'recall':>7}")
+    for r in rows:
+        print(f"{r['chunks']:>9} {r['exact_p50_ms']:>8.3f}ms {r['exact_p99_ms']:>8.3f}ms "
+              f"{r['ivf_p50_ms']:>7.3f}ms {r['ivf_p99_ms']:>7.3f}ms {r['ivf_build_s']:>8.2f} {r['ivf_recall_at_k']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
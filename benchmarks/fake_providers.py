@@ -0,0 +1,133 @@
+"""Local stand-ins for the OpenAI chat completions and ElevenLabs TTS APIs.
+
+Only the endpoints app.py uses are implemented, with configurable latency,
+streaming speed and audio size, so load tests exercise the real client code
+(SDKs, connection pools, limiters) without spending API credits. Run on its
+own to poke at it:
+
+    python benchmarks/fake_providers.py --port 8100 --llm-first-token-ms 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+CHAT_REPLY = (
+    "We build custom web and mobile applications, and we can also help with AI integration. "
+    "Most projects start with a short discovery phase. "
+    "What kind of product are you planning? "
+    '[[ENTITIES]] {"entities": {"requirements": ["mobile app"]}}'
+)
+COMPANY_INFO = {
+    "company_name": "Benchmark Labs",
+    "company_description": "A synthetic software consultancy used for load tests.",
+    "services": [{"name": "Web development", "description": "Custom web apps", "pricing": "From $5,000"}],
+    "industries_served": ["Retail", "Healthcare"],
+    "unique_selling_points": ["Fast delivery"],
+}
+
+
+@dataclass
+class FakeProviderConfig:
+    llm_first_token_ms: float = 300
+    llm_tokens_per_sec: float = 60
+    tts_latency_ms: float = 150
+    audio_bytes_per_char: int = 1000
+
+
+def create_app(config: FakeProviderConfig) -> Starlette:
+    stats = {"chat_requests": 0, "chat_streams": 0, "tts_requests": 0, "tts_bytes": 0}
+
+    def usage(prompt: str, reply: str) -> dict:
+        prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(reply) // 4 + 1
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_requests"] += 1
+        prompt = " ".join(str(m.get("content", "")) for m in body["messages"])
+        # The upload path asks for structured company info and parses the reply as JSON
+        reply = json.dumps(COMPANY_INFO) if "Extract company information" in prompt else CHAT_REPLY
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": body["model"]}
+        await asyncio.sleep(config.llm_first_token_ms / 1000)
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(reply) / 4 / config.llm_tokens_per_sec)
+            return JSONResponse({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage(prompt, reply),
+            })
+
+        stats["chat_streams"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        async def events():
+            # ~4 characters per token
+            for i in range(0, len(reply), 4):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": reply[i:i + 4]}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(1 / config.llm_tokens_per_sec)
+            done = {**base, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            if include_usage:
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage(prompt, reply)})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def text_to_speech(request: Request):
+        body = await request.json()
+        stats["tts_requests"] += 1
+        size = len(body.get("text", "")) * config.audio_bytes_per_char
+        stats["tts_bytes"] += size
+        await asyncio.sleep(config.tts_latency_ms / 1000)
+
+        async def audio():
+            # Not decodable audio, just the right number of bytes in ~4 KB pieces
+            for i in range(0, size, 4096):
+                yield os.urandom(min(4096, size - i))
+
+        return StreamingResponse(audio(), media_type="audio/mpeg")
+
+    async def get_stats(request: Request):
+        return JSONResponse({**stats, "config": asdict(config)})
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/text-to-speech/{voice_id}", text_to_speech, methods=["POST"]),
+        Route("/v1/text-to-speech/{voice_id}/stream", text_to_speech, methods=["POST"]),
+        Route("/stats", get_stats),
+    ])
+
+
+def serve(port: int, config: FakeProviderConfig):
+    uvicorn.run(create_app(config), host="127.0.0.1", port=port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=60)
+    parser.add_argument("--tts-latency-ms", type=float, default=150)
+    parser.add_argument("--audio-bytes-per-char", type=int, default=1000)
+    args = parser.parse_args()
+    serve(args.port, FakeProviderConfig(args.llm_first_token_ms, args.llm_tokens_per_sec,
+                                        args.tts_latency_ms, args.audio_bytes_per_char))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+from typing import TYPE_CHECKING, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+if TYPE_CHECKING:
+    from elevenlabs.client import AsyncElevenLabs
+
+from admission import Overloaded, ProviderLimiter
+
+ELEVENLABS_API_URL = "https://api.elevenlabs.io/"
+
+# Known ElevenLabs premade voices, so the common case skips the /v1/voices lookup
+PREMADE_VOICE_IDS = {
+    "Aria": "9BWtsMINqrJLrRacOk9p",
+}
+
+
+class ProviderClients:
+    """Async OpenAI/ElevenLabs clients on pooled keep-alive connections.
+
+    One instance is shared by every session on the worker; created at startup
+    and closed on shutdown. Each provider has a limiter: synthesize() goes
+    through `tts_limiter` itself, chat completions are wrapped by the caller in
+    `openai_limiter.slot()` (a streamed completion holds its slot until done).
+    """
+
+    def __init__(self, openai_api_key: Optional[str], elevenlabs_api_key: Optional[str],
+                 max_connections: int = 100, timeout: float = 60,
+                 openai_limiter: Optional[ProviderLimiter] = None,
+                 tts_limiter: Optional[ProviderLimiter] = None,
+                 elevenlabs_base_url: Optional[str] = None):
+        self.openai_api_key = openai_api_key
+        self.elevenlabs_api_key = elevenlabs_api_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.elevenlabs_base_url = elevenlabs_base_url
+        self.openai_limiter = openai_limiter or ProviderLimiter("openai", max_connections)
+        self.tts_limiter = tts_limiter or ProviderLimiter("elevenlabs", max_connections)
+        self.openai: Optional[AsyncOpenAI] = None
+        self._openai_http: Optional[httpx.AsyncClient] = None
+        self.elevenlabs: Optional["AsyncElevenLabs"] = None
+        self._tts_http: Optional[httpx.AsyncClient] = None
+        self._voice_ids: Dict[str, str] = dict(PREMADE_VOICE_IDS)
+        self._voice_lock = asyncio.Lock()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections)
+
+    def start(self):
+        # The ElevenLabs SDK is only imported once the clients are actually created
+        from elevenlabs.client import AsyncElevenLabs
+        self._openai_http = DefaultAsyncHttpxClient(limits=self._limits(), timeout=self.timeout)
+        self.openai = AsyncOpenAI(api_key=self.openai_api_key, http_client=self._openai_http)
+        self._tts_http = httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+        self.elevenlabs = AsyncElevenLabs(api_key=self.elevenlabs_api_key, httpx_client=self._tts_http,
+                                          base_url=self.elevenlabs_base_url, timeout=self.timeout)
+
+    async def aclose(self):
+        if self.openai is not None:
+            await self.openai.close()
+        if self._tts_http is not None:
+            await self._tts_http.aclose()
+
+    async def prewarm(self, connections: int = 2):
+        """Open pooled connections (TCP + TLS) to both APIs before the first call needs them.
+
+        Any HTTP response counts: the point is the established keep-alive
+        connection, not the request itself.
+        """
+        urls = [str(self.openai.base_url), self.elevenlabs_base_url or ELEVENLABS_API_URL]
+        clients = [self._openai_http, self._tts_http]
+        await asyncio.gather(*(
+            client.get(url) for client, url in zip(clients, urls) for _ in range(connections)
+        ))
+
+    async def voice_id(self, voice: str) -> str:
+        """Resolve a voice name to its id (cached for the life of the process)"""
+        if voice in self._voice_ids:
+            return self._voice_ids[voice]
+        async with self._voice_lock:
+            if voice not in self._voice_ids:
+                response = await self.elevenlabs.voices.get_all()
+                for v in response.voices:
+                    self._voice_ids.setdefault(v.name, v.voice_id)
+                    self._voice_ids.setdefault(v.voice_id, v.voice_id)
+            if voice not in self._voice_ids:
+                raise ValueError(f"Voice '{voice}' not found.")
+            return self._voice_ids[voice]
+
+    async def synthesize(self, text: str, voice: str = "Aria", model: str = "eleven_flash_v2_5") -> bytes:
+        """Text-to-speech over the pooled connection; returns the full clip.
+
+        ElevenLabs rate limits (429) and timeouts are raised as Overloaded, so
+        callers put the turn on hold exactly as they do for OpenAI.
+        """
+        from elevenlabs.core import ApiError
+
+        async def fetch():
+            voice_id = await self.voice_id(voice)
+            return [chunk async for chunk in self.elevenlabs.text_to_speech.convert(voice_id, text=text, model_id=model)]
+
+        try:
+            async with self.tts_limiter.slot():
+                # convert() hardcodes a 60s request timeout, so ours is enforced here
+                chunks = await asyncio.wait_for(fetch(), self.timeout)
+        except ApiError as e:
+            if e.status_code == 429:
+                raise Overloaded(f"elevenlabs rate limited: {e.body}") from e
+            raise
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            raise Overloaded(f"elevenlabs timed out after {self.timeout}s") from e
+        return b"".join(chunks)
@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+
+class EncoderService:
+    """Process-wide SentenceTransformer shared by every call session.
+
+    The model is loaded once (in a background thread at app startup), warmed up
+    with a dummy encode, and then used by all agents. Every encode runs on one
+    dedicated thread, so the model (and its tokenizer, which is not safe to share
+    between threads) is only ever called from there, without a lock; torch already
+    spreads each forward pass over the cores. Async callers go through `aencode`,
+    so the CPU work never sits on the event loop. sentence_transformers (and torch)
+    are imported by `load`, not at module import, so the process starts fast.
+    """
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+        self.model_name = model_name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder")
+        self._model: Optional["SentenceTransformer"] = None
+        self._load_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._ready_async: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.load_error: Optional[Exception] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def load(self):
+        """Load and warm up the model (blocking, idempotent)"""
+        with self._load_lock:
+            if self._model is None:
+                print(f"Loading sentence encoder '{self.model_name}'...")
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(self.model_name)
+                model.encode(["warmup"])
+                self._model = model
+                print(f"Sentence encoder '{self.model_name}' loaded and warmed up")
+        self._mark_ready()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Start loading the model in a background thread"""
+        self._loop = loop or asyncio.get_running_loop()
+        self._ready_async = asyncio.Event()
+        if self.ready:
+            self._ready_async.set()
+            return
+        threading.Thread(target=self._load_in_background, name="encoder-loader", daemon=True).start()
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception as e:
+            self.load_error = e
+            print(f"Error loading sentence encoder: {str(e)}")
+            # Wake the waiters so they see the failure instead of sitting out their timeout
+            if self._loop is not None and self._ready_async is not None:
+                self._loop.call_soon_threadsafe(self._ready_async.set)
+
+    def _mark_ready(self):
+        self._ready.set()
+        if self._loop is not None and self._ready_async is not None:
+            self._loop.call_soon_threadsafe(self._ready_async.set)
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the model is loaded; returns False on timeout or once loading has failed"""
+        if self.ready:
+            return True
+        if self._ready_async is None or self.load_error is not None:
+            return False
+        try:
+            await asyncio.wait_for(self._ready_async.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.ready
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts with the shared model (thread-safe; blocks until the encoder thread is done)"""
+        return self._executor.submit(self._encode, texts).result()
+
+    async def aencode(self, texts: List[str]) -> np.ndarray:
+        """Encode on the encoder thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._encode, texts)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if self._model is None:
+            self.load()
+        return self._model.encode(texts, convert_to_numpy=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class EmbeddingBatcher:
+    """Coalesces single-query encodes from all sessions into batched forward passes.
+
+    Requests wait up to `max_wait_ms` (or until `max_batch` are queued) and are
+    then encoded together; each caller's future gets its own row. While one
+    batch is encoding the next one is already collecting.
+    """
+
+    def __init__(self, encoder: EncoderService, max_batch: int = 32, max_wait_ms: float = 5):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Embedding of one text, encoded as part of whatever batch is forming"""
+        if self._queue is None:
+            return (await self.encoder.aencode([text]))[0]
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_queue_delay_ms": 1000 * self.queue_delay_total / self.items if self.items else 0.0,
+            "max_queue_delay_ms": 1000 * self.queue_delay_max,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Callers that gave up (e.g. barge-in) don't need encoding
+            batch = [item for item in batch if not item[1].done()]
+            if batch:
+                await self._encode_batch(batch)
+
+    async def _encode_batch(self, batch):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            delay = started - enqueued
+            self.queue_delay_total += delay
+            self.queue_delay_max = max(self.queue_delay_max, delay)
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        try:
+            embeddings = await self.encoder.aencode([text for text, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
@@ -0,0 +1,74 @@
+from typing import List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+class ConversationHistory:
+    """Conversation kept within a token budget.
+
+    Message layout: the system prompt first (a stable prefix, so provider-side
+    prompt caching applies), then a short summary of compacted turns if any, then
+    the recent turns. Turns hold only what was actually said; retrieved context and
+    tracked entities are attached to the current user message when the request is
+    built and never stored. Once the turns exceed `max_tokens`, the oldest ones are
+    folded into the summary as short excerpts (no extra LLM call on the turn path),
+    and the summary itself is capped at `summary_tokens`.
+    """
+
+    def __init__(self, system_prompt: str, max_tokens: int = 1500, summary_tokens: int = 200,
+                 excerpt_chars: int = 120):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.excerpt_chars = excerpt_chars
+        self.reset(system_prompt)
+
+    def reset(self, system_prompt: str):
+        self.system_prompt = system_prompt
+        self.turns: List[dict] = []
+        self.summary_lines: List[str] = []
+        self._turn_tokens = 0
+
+    def to_state(self) -> dict:
+        return {"turns": self.turns, "summary": self.summary_lines}
+
+    def restore(self, state: dict):
+        """Continue from a saved state (same system prompt)"""
+        self.turns = [dict(turn) for turn in state["turns"]]
+        self.summary_lines = list(state["summary"])
+        self._turn_tokens = sum(estimate_tokens(turn["content"]) for turn in self.turns)
+
+    def add(self, role: str, content: str):
+        self.turns.append({"role": role, "content": content})
+        self._turn_tokens += estimate_tokens(content)
+        self._compact()
+
+    def messages(self, turn_context: Optional[str] = None) -> List[dict]:
+        """Request messages; turn_context is appended to the latest user message only"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary_lines:
+            messages.append({
+                "role": "system",
+                "content": "Earlier in this call:\n" + "\n".join(self.summary_lines)
+            })
+        messages.extend(dict(turn) for turn in self.turns)
+        if turn_context:
+            for message in reversed(messages):
+                if message["role"] == "user":
+                    message["content"] = f"User Input: {message['content']}\n\n{turn_context}"
+                    break
+        return messages
+
+    def _compact(self):
+        # Always keep the latest exchange verbatim
+        while self._turn_tokens > self.max_tokens and len(self.turns) > 2:
+            turn = self.turns.pop(0)
+            self._turn_tokens -= estimate_tokens(turn["content"])
+            excerpt = turn["content"][:self.excerpt_chars]
+            if len(turn["content"]) > self.excerpt_chars:
+                excerpt += "..."
+            self.summary_lines.append(f"{turn['role']}: {excerpt}")
+        while self.summary_lines and estimate_tokens("\n".join(self.summary_lines)) > self.summary_tokens:
+            self.summary_lines.pop(0)
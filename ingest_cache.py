@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+from typing import Any, Optional
+
+import numpy as np
+
+
+class IngestCache:
+    """On-disk artifacts of the /upload_knowledge pipeline, keyed by the SHA-256
+    of the uploaded file so an unchanged document is never re-processed.
+
+    Layout: <cache_dir>/<sha256>/<name>.json or <name>.npy
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def _path(self, digest: str, name: str) -> str:
+        return os.path.join(self.cache_dir, digest, name)
+
+    def _write(self, path: str, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def load_json(self, digest: str, name: str) -> Optional[Any]:
+        try:
+            with open(self._path(digest, f"{name}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_json(self, digest: str, name: str, value: Any):
+        try:
+            self._write(self._path(digest, f"{name}.json"),
+                        lambda f: f.write(json.dumps(value).encode("utf-8")))
+        except OSError as e:
+            print(f"Error writing ingest cache entry {name}: {str(e)}")
+
+    def load_array(self, digest: str, name: str) -> Optional[np.ndarray]:
+        try:
+            return np.load(self._path(digest, f"{name}.npy"))
+        except (OSError, ValueError):
+            return None
+
+    def save_array(self, digest: str, name: str, value: np.ndarray):
+        try:
+            self._write(self._path(digest, f"{name}.npy"), lambda f: np.save(f, value))
+        except OSError as e:
+            print(f"Error writing ingest cache entry {name}: {str(e)}")
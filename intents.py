@@ -0,0 +1,51 @@
+import re
+from typing import Iterable, Optional
+
+# Routing decisions
+END_CALL = "end_call"          # caller wants to hang up -> ask for confirmation
+CONFIRM_END = "confirm_end"    # confirmation pending and caller agreed -> farewell
+CANCEL_END = "cancel_end"      # confirmation pending and caller only said no -> carry on, no LLM needed
+RESUME = "resume"              # confirmation pending but caller moved on -> normal turn
+
+CONFIRM_PHRASES = ["yes", "yeah", "yep", "yup", "okay", "ok", "sure", "please do", "go ahead", "correct", "that's right"]
+CANCEL_PHRASES = ["no", "nope", "nah", "not yet", "continue", "keep going", "wait", "don't end", "do not end"]
+# Words that may trail a bare "no" without making it a real question ("no thanks", "no, please continue")
+FILLER_WORDS = ["thanks", "thank you", "please", "continue", "let's continue", "not yet"]
+
+
+def compile_phrases(phrases: Iterable[str]) -> re.Pattern:
+    """One case-insensitive alternation that only matches whole words/phrases"""
+    alternatives = sorted({p.lower() for p in phrases}, key=len, reverse=True)
+    body = "|".join(r"\s+".join(re.escape(word) for word in p.split()) for p in alternatives)
+    return re.compile(rf"(?<![\w'])(?:{body})(?![\w'])", re.IGNORECASE)
+
+
+class IntentRouter:
+    """Word-boundary-aware matcher for the end-call flow.
+
+    Each phrase list is a single precompiled regex, so a turn is classified with
+    a handful of scans regardless of how many phrases there are ("no" doesn't
+    match "know", "stop" doesn't match "nonstop").
+    """
+
+    def __init__(self, end_call_phrases: Iterable[str]):
+        self.end_call = compile_phrases(end_call_phrases)
+        self.confirm = compile_phrases(CONFIRM_PHRASES)
+        self.cancel = compile_phrases(CANCEL_PHRASES)
+        self.cancel_only = re.compile(
+            rf"^\W*(?:{self.cancel.pattern})(?:\W+(?:{compile_phrases(FILLER_WORDS).pattern}))*\W*$",
+            re.IGNORECASE
+        )
+
+    def is_end_call(self, text: str) -> bool:
+        return self.end_call.search(text) is not None
+
+    def route(self, text: str, end_call_pending: bool) -> Optional[str]:
+        """Classify a turn; None means a normal turn that needs RAG + LLM"""
+        if not end_call_pending:
+            return END_CALL if self.is_end_call(text) else None
+        if self.cancel_only.match(text):
+            return CANCEL_END
+        if self.confirm.search(text) or (self.is_end_call(text) and not self.cancel.search(text)):
+            return CONFIRM_END
+        return RESUME
@@ -0,0 +1,651 @@
+import os
+import tempfile
+import threading
+from collections import abc
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# How the in-memory index keeps its vectors
+INDEX_DTYPES = ("float32", "float16", "int8")
+
+
+@dataclass
+class RetrievalResult:
+    chunks: List[str]
+    similarities: List[float]
+    sources: List[str]
+    page_numbers: List[int]
+
+
+def split_into_chunks(text: str, chunk_size: int = 300) -> List[str]:
+    """Split text into sentence-aligned chunks of roughly chunk_size characters"""
+    sentences = text.split('. ')
+    chunks = []
+    current_chunk = []
+    current_length = 0
+
+    for sentence in sentences:
+        sentence = sentence.strip() + '. '
+        sentence_length = len(sentence)
+
+        if current_length + sentence_length > chunk_size and current_chunk:
+            chunks.append(' '.join(current_chunk))
+            current_chunk = [sentence]
+            current_length = sentence_length
+        else:
+            current_chunk.append(sentence)
+            current_length += sentence_length
+
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so cosine similarity becomes a plain dot product"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def quantize_rows(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(codes, scales): float16 rows as they are, or int8 codes with one float32 scale per row"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    scales = np.abs(matrix).max(axis=-1) / 127
+    scales[scales == 0] = 1
+    codes = np.rint(matrix / scales[..., None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedMatrix:
+    """Read-only int8 matrix with per-row scales that indexes like a float32 one.
+
+    Indexing dequantizes just the selected rows, so the IVF index and the
+    store can treat it as a plain embedding matrix; scoring upcasts block by
+    block.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, matrix: np.ndarray, block: int = 65536) -> "QuantizedMatrix":
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        scales = np.empty(matrix.shape[0], dtype=np.float32)
+        for i in range(0, matrix.shape[0], block):
+            codes[i:i + block], scales[i:i + block] = quantize_rows(matrix[i:i + block], "int8")
+        return cls(codes, scales)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.codes.shape
+
+    @property
+    def dtype(self):
+        return self.codes.dtype
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, rows) -> np.ndarray:
+        return self.codes[rows].astype(np.float32) * self.scales[rows][..., None]
+
+    def score(self, query: np.ndarray, block: int = 4096) -> np.ndarray:
+        scores = np.empty(self.codes.shape[0], dtype=np.float32)
+        for i in range(0, self.codes.shape[0], block):
+            scores[i:i + block] = self.codes[i:i + block].astype(np.float32) @ query
+        return scores * self.scales
+
+
+def score_rows(matrix: Union[np.ndarray, QuantizedMatrix], query: np.ndarray, block: int = 4096) -> np.ndarray:
+    """Dot product of every row with the query; non-float32 storage (e.g. a
+    float16 store) is upcast block by block, small enough to stay in cache,
+    instead of copying the whole matrix"""
+    if isinstance(matrix, QuantizedMatrix):
+        return matrix.score(query, block)
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+    for i in range(0, matrix.shape[0], block):
+        scores[i:i + block] = matrix[i:i + block].astype(np.float32) @ query
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+class Column:
+    """Growable 1-D array.
+
+    Appends write past the end in place and a full (or read-only, e.g.
+    memory-mapped) buffer is replaced by a larger copy, so a `view()`
+    handed out earlier never changes underneath its reader.
+    """
+
+    def __init__(self, dtype, data: Optional[np.ndarray] = None):
+        self.data = np.zeros(16, dtype=dtype) if data is None else data
+        self.count = 0 if data is None else len(data)
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        needed = self.count + len(values)
+        if needed > len(self.data) or not self.data.flags.writeable:
+            # Doubles for steady appends, fits one big batch exactly
+            capacity = max(16, needed, 2 * self.count)
+            data = np.zeros(capacity, dtype=self.data.dtype)
+            data[:self.count] = self.data[:self.count]
+            self.data = data
+        self.data[self.count:needed] = values
+        self.count = needed
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.count]
+
+
+class TextTable(abc.Sequence):
+    """Strings stored back to back in one UTF-8 buffer, addressed by offsets"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+
+class LabelTable(abc.Sequence):
+    """Per-row labels stored as ids into a small table of distinct values"""
+
+    def __init__(self, ids: np.ndarray, labels):
+        self.ids = ids
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.labels[self.ids[i]]
+
+
+class ChunkTable:
+    """Chunk text, source and page of every indexed row, in growable arrays.
+
+    Hundreds of thousands of chunks as Python str/int objects cost several
+    times their UTF-8 size; here text is one byte buffer plus offsets, sources
+    are ids into a short list of file names, and pages are int32. Snapshots get
+    read-only views (`tables()`), which appends never touch.
+    """
+
+    def __init__(self):
+        self.text = Column(np.uint8)
+        self.offsets = Column(np.int64)
+        self.offsets.extend([0])
+        self.source_ids = Column(np.int32)
+        self.pages = Column(np.int32)
+        self.labels: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+
+    @classmethod
+    def from_rows(cls, documents: Sequence[str], sources: Sequence[str], page_numbers: Sequence[int]) -> "ChunkTable":
+        """Table over existing rows; tables loaded from the store are reused as they are (mapped)"""
+        table = cls()
+        if isinstance(documents, TextTable) and isinstance(sources, LabelTable):
+            table.text = Column(np.uint8, documents.blob)
+            table.offsets = Column(np.int64, documents.offsets)
+            table.source_ids = Column(np.int32, np.asarray(sources.ids, dtype=np.int32))
+            table.pages = Column(np.int32, np.asarray(page_numbers, dtype=np.int32))
+            table.labels = list(sources.labels)
+            table._label_ids = {label: i for i, label in enumerate(table.labels)}
+        elif len(documents):
+            table.extend(list(documents), list(sources), list(page_numbers))
+        return table
+
+    def __len__(self):
+        return self.pages.count
+
+    def extend(self, chunks: List[str], sources: List[str], page_numbers: List[int]):
+        encoded = [c.encode("utf-8") for c in chunks]
+        self.offsets.extend(self.text.count + np.cumsum([len(e) for e in encoded], dtype=np.int64))
+        self.text.extend(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        for source in sources:
+            if source not in self._label_ids:
+                self._label_ids[source] = len(self.labels)
+                self.labels.append(source)
+        self.source_ids.extend([self._label_ids[s] for s in sources])
+        self.pages.extend(page_numbers)
+
+    def rows_from(self, source: str) -> np.ndarray:
+        if source not in self._label_ids:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.source_ids.view() == self._label_ids[source])
+
+    def select(self, rows: np.ndarray) -> "ChunkTable":
+        """New table with only `rows` (used for compaction)"""
+        offsets = self.offsets.view()
+        starts, ends = offsets[rows], offsets[rows + 1]
+        lengths = ends - starts
+        table = ChunkTable()
+        new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_offsets[1:])
+        if len(rows):
+            # Byte positions of every kept chunk, gathered in one go
+            positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+            table.text = Column(np.uint8, self.text.view()[positions])
+        table.offsets = Column(np.int64, new_offsets)
+        table.source_ids = Column(np.int32, self.source_ids.view()[rows])
+        table.pages = Column(np.int32, self.pages.view()[rows])
+        table.labels = list(self.labels)
+        table._label_ids = dict(self._label_ids)
+        return table
+
+    def tables(self) -> Tuple[TextTable, LabelTable, np.ndarray]:
+        """(documents, sources, page_numbers) as read-only views for a snapshot"""
+        # The labels list is only ever appended to, so sharing it is safe
+        return (TextTable(self.text.view(), self.offsets.view()),
+                LabelTable(self.source_ids.view(), self.labels),
+                self.pages.view())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.view().nbytes for c in (self.text, self.offsets, self.source_ids, self.pages))
+
+
+class IVFIndex:
+    """Inverted-file ANN index over a normalized embedding matrix.
+
+    Rows are clustered with spherical k-means; a query only scores the rows in
+    its `nprobe` nearest clusters. Lists are immutable arrays, so `extend`
+    returns a new index that shares the untouched ones.
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray], trained_on: int, nprobe: int = 16):
+        self.centroids = centroids
+        self.lists = lists
+        self.trained_on = trained_on
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, n_lists: Optional[int] = None, nprobe: int = 16,
+              n_iter: int = 10, sample_size: int = 50000, seed: int = 0) -> "IVFIndex":
+        n = matrix.shape[0]
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, min(n, max(sample_size, n_lists)), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        index = cls(centroids, [np.zeros(0, dtype=np.int64)] * n_lists, trained_on=n, nprobe=nprobe)
+        return index.extend(matrix, 0)
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[i:i + block] @ centroids.T, axis=1)
+            for i in range(0, vectors.shape[0], block)
+        ]) if vectors.shape[0] else np.zeros(0, dtype=np.int64)
+
+    def extend(self, vectors: np.ndarray, offset: int) -> "IVFIndex":
+        """New index with `vectors` (row ids starting at offset) added to their nearest lists"""
+        assignment = self._assign(vectors, self.centroids)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(len(self.lists) + 1))
+        lists = list(self.lists)
+        for c in np.unique(assignment):
+            new_rows = order[bounds[c]:bounds[c + 1]] + offset
+            lists[c] = np.concatenate([lists[c], new_rows])
+        return IVFIndex(self.centroids, lists, self.trained_on, self.nprobe)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        probes = top_k(self.centroids @ query, self.nprobe)
+        return np.concatenate([self.lists[c] for c in probes])
+
+
+def split_pages_into_chunks(pages: Iterable[Tuple[int, str]], chunk_size: int = 300) -> Tuple[List[str], List[int]]:
+    """Chunk each page separately so every chunk carries the page it came from"""
+    chunks, page_numbers = [], []
+    for page_number, text in sorted(pages):
+        if not text.strip():
+            continue
+        page_chunks = split_into_chunks(text, chunk_size)
+        chunks.extend(page_chunks)
+        page_numbers.extend([page_number] * len(page_chunks))
+    return chunks, page_numbers
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Immutable, versioned view of the knowledge base shared by all agents.
+
+    Rows [0:n) of the backing lists/matrix are never modified once published,
+    so a snapshot can reference them without copying. Removed chunks are masked
+    out via `alive` rather than physically deleted. Embeddings are L2-normalized,
+    and `ann` is set once the corpus is large enough to warrant it.
+
+    When `embeddings` are compact (float16 or int8), `exact` holds the same rows
+    at full precision, usually on disk: the scan picks `rerank` candidates from
+    the compact vectors and only those rows are read back and scored exactly.
+    """
+    version: int = 0
+    documents: Sequence[str] = ()
+    sources: Sequence[str] = ()
+    page_numbers: Sequence[int] = ()
+    embeddings: Union[np.ndarray, QuantizedMatrix] = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+    alive: Optional[np.ndarray] = None
+    ann: Optional[IVFIndex] = None
+    exact: Optional[np.ndarray] = None
+    rerank: int = 32
+
+    def __len__(self):
+        if self.alive is not None:
+            return int(self.alive.sum())
+        return self.embeddings.shape[0]
+
+    def search(self, query_embedding: np.ndarray, k: int = 3) -> RetrievalResult:
+        """Top-k chunks by cosine similarity to the query embedding"""
+        if not len(self):
+            return RetrievalResult([], [], [], [])
+
+        query = normalize_rows(query_embedding)
+        wanted = min(k, len(self))
+        # Never more than the live rows, so masked ones can't come back through the re-rank
+        shortlist = min(max(wanted, self.rerank), len(self)) if self.exact is not None else wanted
+        if self.ann is not None:
+            rows = self.ann.candidates(query)
+            if self.alive is not None:
+                rows = rows[self.alive[rows]]
+            scores = score_rows(self.embeddings[rows], query)
+            best = top_k(scores, shortlist)
+            top_k_indices, similarities = rows[best], scores[best]
+        else:
+            scores = score_rows(self.embeddings, query)
+            if self.alive is not None:
+                scores[~self.alive] = -np.inf
+            top_k_indices = top_k(scores, shortlist)
+            similarities = scores[top_k_indices]
+
+        if self.exact is not None:
+            # Sorted rows read the (possibly memory-mapped) matrix in file order
+            rows = np.sort(top_k_indices)
+            scores = score_rows(self.exact[rows], query)
+            best = top_k(scores, wanted)
+            top_k_indices, similarities = rows[best], scores[best]
+
+        return RetrievalResult(
+            chunks=[self.documents[i] for i in top_k_indices],
+            similarities=[float(s) for s in similarities],
+            sources=[self.sources[i] for i in top_k_indices],
+            page_numbers=[int(self.page_numbers[i]) for i in top_k_indices]
+        )
+
+
+class KnowledgeBase:
+    """Process-wide, append-only knowledge base.
+
+    Readers grab `snapshot` (a plain attribute read, so always a consistent
+    version); writers publish a new snapshot under a lock (copy-on-write), so an
+    upload is encoded once no matter how many calls are live.
+
+    Only newly added chunks are encoded, in batches, straight into a
+    preallocated matrix that doubles in capacity when full. Removing a
+    source only flips rows in the liveness mask; the matrix is compacted (rows
+    copied, never re-encoded) once most of it is dead.
+
+    `dtype` sets how vectors are held in memory: float32, float16 (half the
+    size) or int8 with a scale per row (a quarter). float16 trades latency for
+    memory: numpy upcasts it in software, so a brute-force scan is several
+    times slower than float32, while int8 stays close to float32 speed. With
+    the compact ones the full-precision rows go to an unlinked file in
+    `spill_dir`, memory-mapped so the OS keeps them on disk, and searches
+    re-rank their top `rerank` candidates against them. Chunk text and
+    metadata live in a ChunkTable.
+
+    Vectors are normalized at index time. Once the corpus reaches
+    `ann_threshold` chunks an IVF index is built and extended on later appends;
+    it is retrained when the corpus has doubled since it was last trained.
+    """
+
+    def __init__(self, encoder, batch_size: int = 64, initial_capacity: int = 1024,
+                 compact_ratio: float = 0.5, ann_threshold: int = 50000, ann_nprobe: int = 16,
+                 dtype: str = "float32", rerank: int = 32, spill_dir: Optional[str] = None):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"Unsupported index dtype: {dtype}")
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.initial_capacity = initial_capacity
+        self.compact_ratio = compact_ratio
+        self.ann_threshold = ann_threshold
+        self.ann_nprobe = ann_nprobe
+        self.dtype = dtype
+        self.rerank = rerank
+        self.spill_dir = spill_dir
+        self._write_lock = threading.Lock()
+        # Vectors as stored (codes for int8), their scales, and the full-precision copy
+        self._matrix: Optional[np.ndarray] = None
+        self._scales = Column(np.float32)
+        self._exact: Optional[np.ndarray] = None
+        self._count = 0
+        self._chunks = ChunkTable()
+        self._alive = np.zeros(0, dtype=bool)
+        self._ann: Optional[IVFIndex] = None
+        self._ann_rows = 0
+        self._snapshot = IndexSnapshot()
+
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes per part; `exact` is the full-precision copy kept on disk for re-ranking"""
+        return {
+            "vectors": self._vectors().nbytes,
+            "exact": self._exact[:self._count].nbytes if self._exact is not None else 0,
+            "tables": self._chunks.nbytes,
+        }
+
+    def adopt(self, snapshot: IndexSnapshot):
+        """Use a prebuilt (e.g. memory-mapped) snapshot as the current index.
+
+        The mapped arrays are only read; the first append copies them into a
+        growable in-memory matrix. With a compact dtype the vectors are
+        quantized into memory and the mapped ones are kept for re-ranking.
+        """
+        with self._write_lock:
+            count = snapshot.embeddings.shape[0]
+            self._count = count
+            self._chunks = ChunkTable.from_rows(snapshot.documents, snapshot.sources, snapshot.page_numbers)
+            self._alive = np.ones(count, dtype=bool) if snapshot.alive is None else snapshot.alive.copy()
+            self._scales = Column(np.float32)
+            self._exact = None
+            if not count:
+                self._matrix = None
+            elif self.dtype == "float32":
+                self._matrix = snapshot.embeddings
+            else:
+                self._exact = snapshot.exact if snapshot.exact is not None else snapshot.embeddings
+                if self.dtype == "int8":
+                    quantized = QuantizedMatrix.quantize(self._exact)
+                    self._matrix, self._scales = quantized.codes, Column(np.float32, quantized.scales)
+                else:
+                    self._matrix = np.asarray(self._exact, dtype=np.float16)
+            self._ann = snapshot.ann
+            self._ann_rows = count if snapshot.ann is not None else 0
+            self._snapshot = self._current(snapshot.version)
+
+    def encode_chunks(self, chunks: List[str]) -> np.ndarray:
+        """Encode chunks in batches into a normalized float32 matrix"""
+        batches = [
+            normalize_rows(self.encoder.encode(chunks[i:i + self.batch_size]))
+            for i in range(0, len(chunks), self.batch_size)
+        ]
+        return np.vstack(batches)
+
+    def add_chunks(self, chunks: List[str], embeddings: np.ndarray, source: str,
+                   page_numbers: List[int], replace_source: bool = False) -> IndexSnapshot:
+        """Index already-encoded (normalized) chunks as one new snapshot version.
+
+        With replace_source, chunks previously indexed from `source` are dropped
+        in the same version, so re-uploading a document doesn't duplicate it.
+        """
+        with self._write_lock:
+            if replace_source:
+                self._tombstone(source)
+            if chunks:
+                self._append(chunks, np.asarray(embeddings, dtype=np.float32), source, page_numbers)
+            self._publish()
+            print(f"Knowledge base v{self.version}: {len(chunks)} new chunks from {source}, {len(self._snapshot)} total")
+            return self._snapshot
+
+    def remove_source(self, source: str) -> int:
+        """Drop every chunk that came from `source`; returns the number removed"""
+        with self._write_lock:
+            removed = self._tombstone(source)
+            if not removed:
+                return 0
+            self._publish()
+            print(f"Knowledge base v{self.version}: removed {removed} chunks from {source}")
+            return removed
+
+    def _tombstone(self, source: str) -> int:
+        rows = self._chunks.rows_from(source)
+        rows = rows[self._alive[rows]]
+        if not len(rows):
+            return 0
+        # New mask array so already published snapshots keep theirs
+        alive = self._alive.copy()
+        alive[rows] = False
+        self._alive = alive
+        if 1 - alive[:self._count].mean() > self.compact_ratio:
+            self._compact()
+        return len(rows)
+
+    def _append(self, chunks: List[str], embeddings: np.ndarray, source: str, page_numbers: List[int]):
+        needed = self._count + len(chunks)
+        if self._matrix is None or needed > self._matrix.shape[0]:
+            self._grow(needed, embeddings.shape[1])
+        # Rows past _count are invisible to published snapshots, safe to fill in place
+        if self.dtype == "float32":
+            self._matrix[self._count:needed] = embeddings
+        else:
+            codes, scales = quantize_rows(embeddings, self.dtype)
+            self._matrix[self._count:needed] = codes
+            if scales is not None:
+                self._scales.extend(scales)
+            self._exact[self._count:needed] = embeddings
+        alive = np.ones(self._matrix.shape[0], dtype=bool)
+        alive[:self._count] = self._alive[:self._count]
+        self._alive = alive
+        self._chunks.extend(chunks, [source] * len(chunks), page_numbers)
+        self._count = needed
+
+    def _spill(self, shape: Tuple[int, int]) -> np.ndarray:
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        # Unlinked right away; the mapping keeps it alive for as long as a snapshot uses it
+        return np.memmap(tempfile.TemporaryFile(dir=self.spill_dir), dtype=np.float32, mode="w+", shape=shape)
+
+    def _grow(self, needed: int, dim: int):
+        capacity = self.initial_capacity if self._matrix is None else self._matrix.shape[0]
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, dim), dtype=self.dtype)
+        if self._matrix is not None:
+            matrix[:self._count] = self._matrix[:self._count]
+        # Old snapshots keep pointing at the previous buffers
+        self._matrix = matrix
+        if self.dtype != "float32":
+            exact = self._spill((capacity, dim))
+            if self._exact is not None:
+                exact[:self._count] = self._exact[:self._count]
+            self._exact = exact
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._count])
+        shape = (max(self.initial_capacity, len(keep)), self._matrix.shape[1])
+        matrix = np.zeros(shape, dtype=self.dtype)
+        matrix[:len(keep)] = self._matrix[keep]
+        self._matrix = matrix
+        if self.dtype == "int8":
+            self._scales = Column(np.float32, self._scales.view()[keep])
+        if self._exact is not None:
+            exact = self._spill(shape)
+            exact[:len(keep)] = self._exact[keep]
+            self._exact = exact
+        # Fresh table: published snapshots still reference the old one
+        self._chunks = self._chunks.select(keep)
+        self._count = len(keep)
+        self._alive = np.ones(matrix.shape[0], dtype=bool)
+        # Row ids changed; the ANN index is rebuilt on publish
+        self._ann = None
+        self._ann_rows = 0
+
+    def _vectors(self) -> Union[np.ndarray, QuantizedMatrix]:
+        if self._matrix is None:
+            return IndexSnapshot().embeddings
+        if self.dtype == "int8":
+            return QuantizedMatrix(self._matrix[:self._count], self._scales.view())
+        return self._matrix[:self._count]
+
+    def _refresh_ann(self):
+        if self._count < self.ann_threshold:
+            self._ann, self._ann_rows = None, 0
+            return
+        embeddings = self._vectors()
+        if self._ann is None or self._count > 2 * self._ann.trained_on:
+            print(f"Building IVF index over {self._count} chunks")
+            self._ann = IVFIndex.build(embeddings, nprobe=self.ann_nprobe)
+        elif self._count > self._ann_rows:
+            self._ann = self._ann.extend(embeddings[self._ann_rows:], self._ann_rows)
+        self._ann_rows = self._count
+
+    def _current(self, version: int) -> IndexSnapshot:
+        documents, sources, page_numbers = self._chunks.tables()
+        alive = self._alive[:self._count]
+        return IndexSnapshot(
+            version=version,
+            documents=documents,
+            sources=sources,
+            page_numbers=page_numbers,
+            embeddings=self._vectors(),
+            alive=None if alive.all() else alive,
+            ann=self._ann,
+            exact=self._exact[:self._count] if self._exact is not None else None,
+            rerank=self.rerank
+        )
+
+    def _publish(self):
+        self._refresh_ann()
+        self._snapshot = self._current(self._snapshot.version + 1)
@@ -0,0 +1,187 @@
+import json
+import os
+import shutil
+import uuid
+from typing import Optional, Tuple
+
+import numpy as np
+
+from kb_index import IVFIndex, IndexSnapshot, LabelTable, TextTable
+
+# Bumped whenever the on-disk layout changes
+STORE_FORMAT = 1
+
+
+def pack_texts(texts) -> Tuple[bytes, np.ndarray]:
+    encoded = [t.encode("utf-8") for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+
+def pack_labels(values) -> Tuple[np.ndarray, list]:
+    labels = {}
+    ids = np.fromiter((labels.setdefault(v, len(labels)) for v in values), dtype=np.int32, count=len(values))
+    return ids, list(labels)
+
+
+def _map_bytes(path: str) -> np.ndarray:
+    # np.memmap refuses empty files
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+# Store versions kept on disk, the current one included
+KEEP_VERSIONS = 3
+# Times load_snapshot re-reads CURRENT when the version it named was pruned meanwhile
+LOAD_ATTEMPTS = 3
+
+
+def _version_key(root: str, name: str):
+    # v<version>-<id>; the directory mtime breaks ties between workers
+    try:
+        version = int(name[1:].split("-", 1)[0])
+    except ValueError:
+        version = -1
+    return version, os.path.getmtime(os.path.join(root, name))
+
+
+def prune_versions(root: str, keep: int = KEEP_VERSIONS, current: Optional[str] = None):
+    """Delete all but the newest `keep` versions (never `current`).
+
+    Older versions aren't removed on the save that supersedes them: another
+    worker may have just read CURRENT and still be opening the previous one.
+    """
+    names = []
+    for entry in os.listdir(root):
+        if entry.startswith("v") and entry != current and os.path.isdir(os.path.join(root, entry)):
+            try:
+                names.append((_version_key(root, entry), entry))
+            except OSError:
+                continue
+    names.sort(reverse=True)
+    for _, entry in names[max(keep - (current is not None), 0):]:
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def save_snapshot(snapshot: IndexSnapshot, root: str, dtype: str = "float32", extra: Optional[dict] = None,
+                  keep: int = KEEP_VERSIONS) -> str:
+    """Write the live rows of a snapshot as a new store version and make it current.
+
+    Each version goes to its own directory; the CURRENT pointer is swapped
+    atomically so readers (other workers, a restart) never see a partial write.
+    The newest `keep` versions stay on disk, so a reader that resolved CURRENT
+    just before the swap can still open the version it saw.
+    """
+    os.makedirs(root, exist_ok=True)
+    name = f"v{snapshot.version}-{uuid.uuid4().hex[:8]}"
+    tmp_dir = os.path.join(root, f".{name}.tmp")
+    os.makedirs(tmp_dir)
+
+    rows = np.arange(snapshot.embeddings.shape[0]) if snapshot.alive is None else np.flatnonzero(snapshot.alive)
+    # Compact in-memory vectors are saved from their full-precision copy
+    vectors = snapshot.exact if snapshot.exact is not None else snapshot.embeddings
+    embeddings = np.asarray(vectors[rows], dtype=dtype)
+    blob, offsets = pack_texts([snapshot.documents[i] for i in rows])
+    source_ids, sources = pack_labels([snapshot.sources[i] for i in rows])
+    pages = np.asarray([snapshot.page_numbers[i] for i in rows], dtype=np.int32)
+
+    np.save(os.path.join(tmp_dir, "embeddings.npy"), embeddings)
+    np.save(os.path.join(tmp_dir, "text_offsets.npy"), offsets)
+    with open(os.path.join(tmp_dir, "texts.bin"), "wb") as f:
+        f.write(blob)
+    np.save(os.path.join(tmp_dir, "source_ids.npy"), source_ids)
+    np.save(os.path.join(tmp_dir, "pages.npy"), pages)
+
+    manifest = {
+        "format": STORE_FORMAT,
+        "version": snapshot.version,
+        "count": int(len(rows)),
+        "dtype": dtype,
+        "sources": sources,
+        "ivf": None,
+    }
+    # Row ids only line up with the saved IVF lists when nothing was dropped
+    if snapshot.ann is not None and snapshot.alive is None:
+        ann = snapshot.ann
+        np.save(os.path.join(tmp_dir, "ivf_centroids.npy"), ann.centroids)
+        np.save(os.path.join(tmp_dir, "ivf_rows.npy"), np.concatenate(ann.lists))
+        np.save(os.path.join(tmp_dir, "ivf_offsets.npy"),
+                np.concatenate([[0], np.cumsum([len(l) for l in ann.lists])]).astype(np.int64))
+        manifest["ivf"] = {"nprobe": ann.nprobe, "trained_on": ann.trained_on}
+    manifest.update(extra or {})
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    final_dir = os.path.join(root, name)
+    os.rename(tmp_dir, final_dir)
+    pointer_tmp = os.path.join(root, "CURRENT.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, "CURRENT"))
+
+    # Workers still mapping a pruned version keep its pages until they reload
+    prune_versions(root, keep, current=name)
+    print(f"Saved knowledge base v{snapshot.version} ({len(rows)} chunks) to {final_dir}")
+    return final_dir
+
+
+def load_snapshot(root: str, name: Optional[str] = None) -> Optional[Tuple[IndexSnapshot, dict]]:
+    """Memory-map the current store version, or version `name` (a directory under
+    `root`); returns (snapshot, manifest) or None"""
+    if name is not None:
+        try:
+            return _load_version(os.path.join(root, name))
+        except FileNotFoundError:
+            print(f"Knowledge base store {name} is no longer in {root}")
+            return None
+    for attempt in range(LOAD_ATTEMPTS):
+        try:
+            with open(os.path.join(root, "CURRENT")) as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        try:
+            return _load_version(os.path.join(root, name))
+        except FileNotFoundError:
+            # Pruned by another worker's save after we read CURRENT; it points further on now
+            print(f"Knowledge base store {name} disappeared while loading, retrying")
+    print(f"Could not load the knowledge base store in {root}: versions kept disappearing")
+    return None
+
+
+def _load_version(directory: str) -> Optional[Tuple[IndexSnapshot, dict]]:
+    try:
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != STORE_FORMAT:
+        print(f"Ignoring knowledge base store with unsupported format {manifest.get('format')}")
+        return None
+
+    def mapped(name):
+        return np.load(os.path.join(directory, name), mmap_mode="r")
+
+    ann = None
+    if manifest.get("ivf"):
+        rows, offsets = mapped("ivf_rows.npy"), mapped("ivf_offsets.npy")
+        lists = [rows[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        ann = IVFIndex(np.load(os.path.join(directory, "ivf_centroids.npy")), lists,
+                       trained_on=manifest["ivf"]["trained_on"], nprobe=manifest["ivf"]["nprobe"])
+
+    snapshot = IndexSnapshot(
+        version=manifest["version"],
+        documents=TextTable(_map_bytes(os.path.join(directory, "texts.bin")), mapped("text_offsets.npy")),
+        sources=LabelTable(mapped("source_ids.npy"), manifest["sources"]),
+        page_numbers=mapped("pages.npy"),
+        embeddings=mapped("embeddings.npy"),
+        ann=ann
+    )
+    print(f"Loaded knowledge base v{snapshot.version} ({manifest['count']} chunks) from {directory}")
+    return snapshot, manifest
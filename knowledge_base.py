@@ -1,8 +1,15 @@
+import argparse
+import hashlib
 import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from openai import OpenAI
-import PyPDF2
 import os
-from config import ELEVEN_LABS_API_KEY,OPENAI_API_KEY
+import time
+from pdf_extract import extract_pages
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+ENCODER_MODEL_NAME = os.environ.get("ENCODER_MODEL_NAME", "all-MiniLM-L6-v2")
 
 class PDFProcessor:
     def __init__(self, api_key):
@@ -12,14 +19,12 @@ class PDFProcessor:
         """Extract text from PDF file"""
         try:
             with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                if not text.strip():  # Check if text is empty
-                    raise ValueError("No text extracted from PDF")
-                print("Extracted PDF Text:", text)  # Debugging log
-                return text
+                pages = extract_pages(file.read())
+            text = "".join(pages)
+            if not text.strip():  # Check if text is empty
+                raise ValueError("No text extracted from PDF")
+            print(f"Extracted {len(text)} characters from {len(pages)} pages")  # Debugging log
+            return text
         except Exception as e:
             print(f"Error reading PDF: {str(e)}")
             return None
@@ -128,6 +133,88 @@ class PDFProcessor:
             print(f"Error generating prompt: {str(e)}")
             return None
 
+def _extract_file(pdf_path):
+    """Worker: (path, sha256, per-page text) for one PDF"""
+    with open(pdf_path, 'rb') as file:
+        content = file.read()
+    # One process per file already; don't nest another pool
+    return pdf_path, hashlib.sha256(content).hexdigest(), extract_pages(content, workers=1)
+
+def build_bundle(pdf_dir, output_dir, workers=None, batch_size=256, dtype="float32", with_prompt=True):
+    """Process every PDF in pdf_dir into one versioned index bundle (kb_store layout)"""
+    # Heavy imports only for batch mode
+    from encoder_service import EncoderService
+    from kb_index import KnowledgeBase, split_pages_into_chunks
+    from kb_store import save_snapshot
+
+    pdf_paths = sorted(
+        os.path.join(pdf_dir, name) for name in os.listdir(pdf_dir) if name.lower().endswith(".pdf")
+    )
+    if not pdf_paths:
+        print(f"No PDF files found in {pdf_dir}")
+        return None
+
+    start = time.perf_counter()
+    print(f"Extracting text from {len(pdf_paths)} PDFs...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        extracted = list(pool.map(_extract_file, pdf_paths))
+    print(f"Extracted {sum(len(pages) for _, _, pages in extracted)} pages in {time.perf_counter() - start:.1f}s")
+
+    # Chunk everything first so the encoder sees large batches
+    documents = []
+    for pdf_path, digest, pages in extracted:
+        chunks, page_numbers = split_pages_into_chunks(enumerate(pages, start=1))
+        if chunks:
+            documents.append((os.path.basename(pdf_path), chunks, page_numbers))
+        else:
+            print(f"Warning: No text extracted from {pdf_path}")
+    if not documents:
+        print(f"No text extracted from any PDF in {pdf_dir}")
+        return None
+
+    knowledge_base = KnowledgeBase(EncoderService(ENCODER_MODEL_NAME), batch_size=batch_size)
+    all_chunks = [chunk for _, chunks, _ in documents for chunk in chunks]
+    print(f"Encoding {len(all_chunks)} chunks...")
+    embeddings = knowledge_base.encode_chunks(all_chunks)
+    offset = 0
+    for source, chunks, page_numbers in documents:
+        knowledge_base.add_chunks(chunks, embeddings[offset:offset + len(chunks)], source, page_numbers)
+        offset += len(chunks)
+
+    sales_prompt = None
+    structured_info = None
+    if with_prompt:
+        processor = PDFProcessor(api_key=OPENAI_API_KEY)
+        pdf_text = "\n".join("".join(pages) for _, _, pages in extracted)
+        print("Structuring company information...")
+        structured_info = processor.structure_company_info(pdf_text)
+        if structured_info:
+            print("Generating sales agent prompt...")
+            sales_prompt = processor.create_sales_prompt(structured_info)
+        if not sales_prompt:
+            print("Failed to generate sales prompt; bundle will only contain the index")
+
+    bundle_id = hashlib.sha256("".join(digest for _, digest, _ in extracted).encode()).hexdigest()[:16]
+    extra = {
+        "bundle_id": f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{bundle_id}",
+        "encoder": ENCODER_MODEL_NAME,
+        "files": {os.path.basename(path): digest for path, digest, _ in extracted},
+    }
+    if sales_prompt:
+        extra["prompt"] = sales_prompt
+    save_snapshot(knowledge_base.snapshot, output_dir, dtype=dtype, extra=extra)
+
+    if structured_info:
+        with open(os.path.join(output_dir, "structured_company_info.json"), "w") as f:
+            json.dump(structured_info, f, indent=2)
+    if sales_prompt:
+        with open(os.path.join(output_dir, "sales_agent_prompt.txt"), "w") as f:
+            f.write(sales_prompt)
+
+    print(f"Bundle {extra['bundle_id']}: {len(knowledge_base.snapshot)} chunks from {len(documents)} PDFs "
+          f"written to {output_dir} in {time.perf_counter() - start:.1f}s")
+    return extra["bundle_id"]
+
 def main():
     # Get API key from environment variable
     api_key = OPENAI_API_KEY
@@ -176,4 +263,17 @@ def main():
     print(sales_prompt)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the sales agent knowledge base from company PDFs")
+    parser.add_argument("--batch", metavar="PDF_DIR", help="Process every PDF in PDF_DIR non-interactively")
+    parser.add_argument("--output", default="kb_bundle", help="Bundle directory to write (load it with KB_BUNDLE_DIR)")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per encoder batch")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--no-prompt", action="store_true", help="Only build the index, skip the OpenAI calls")
+    args = parser.parse_args()
+
+    if args.batch:
+        build_bundle(args.batch, args.output, workers=args.workers, batch_size=args.batch_size,
+                     dtype=args.dtype, with_prompt=not args.no_prompt)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,119 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# (name, type, help, labels, value) as produced by a collector at scrape time
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Summary:
+    """Count/sum of all observations plus a window of recent ones for quantiles"""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self) -> List[Tuple[float, float]]:
+        if not self.samples:
+            return []
+        values = np.quantile(np.fromiter(self.samples, dtype=np.float64), QUANTILES)
+        return list(zip(QUANTILES, values.tolist()))
+
+
+class Metrics:
+    """In-process metrics rendered in the Prometheus text format.
+
+    Latencies are summaries (p50/p95/p99 over the last `window` observations);
+    counters only go up; anything that already keeps its own numbers (caches,
+    limiters, session count) is read through a collector when /metrics is scraped.
+    """
+
+    def __init__(self, prefix: str, window: int = 1024):
+        self.prefix = prefix
+        self.window = window
+        self._help: Dict[str, str] = {}
+        self._summaries: Dict[str, Dict[Tuple, Summary]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._summaries.setdefault(name, {})
+        if key not in series:
+            series[key] = Summary(self.window)
+        series[key].observe(value)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time a block into the stage latency summary"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+    def register(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {self.prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+
+        for name, series in self._summaries.items():
+            header(name, "summary", self._help.get(name, name))
+            full = f"{self.prefix}_{name}"
+            for key, summary in series.items():
+                labels = dict(key)
+                for q, value in summary.quantiles():
+                    lines.append(f"{full}{_labels({**labels, 'quantile': str(q)})} {value:.6f}")
+                lines.append(f"{full}_sum{_labels(labels)} {summary.sum:.6f}")
+                lines.append(f"{full}_count{_labels(labels)} {summary.count}")
+
+        for name, series in self._counters.items():
+            header(name, "counter", self._help.get(name, name))
+            for key, value in series.items():
+                lines.append(f"{self.prefix}_{name}{_labels(dict(key))} {_number(value)}")
+
+        # Samples of one metric must be contiguous, whichever collector they came from
+        collected: Dict[str, List[Sample]] = {}
+        for collector in self._collectors:
+            for sample in collector():
+                collected.setdefault(sample[0], []).append(sample)
+        for name, samples in collected.items():
+            header(name, samples[0][1], samples[0][2])
+            for _, _, _, labels, value in samples:
+                lines.append(f"{self.prefix}_{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,104 @@
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import PyPDF2
+
+# Opened once per worker process and kept while tasks keep coming for the same
+# file, so the PDF isn't re-parsed for every page range. Keyed by (path, size,
+# mtime) since a temp path can come back for another upload, and dropped after
+# the job's last ranges so idle pool workers don't hold on to the document
+_worker_reader: Optional[Tuple[Tuple[str, int, int], "PyPDF2.PdfReader"]] = None
+
+
+def _open_pdf(content: bytes) -> "PyPDF2.PdfReader":
+    # Imported on first use; only uploads and the batch builder need it
+    import PyPDF2
+    return PyPDF2.PdfReader(io.BytesIO(content))
+
+
+def _extract_range(path: str, start: int, end: int, release: bool = False) -> List[Tuple[int, str]]:
+    global _worker_reader
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if _worker_reader is None or _worker_reader[0] != key:
+        _worker_reader = None
+        with open(path, "rb") as f:
+            _worker_reader = (key, _open_pdf(f.read()))
+    reader = _worker_reader[1]
+    try:
+        return [(i + 1, reader.pages[i].extract_text() or "") for i in range(start, end)]
+    finally:
+        if release:
+            _worker_reader = None
+
+
+def create_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Extraction pool to keep for the life of a server.
+
+    Workers are started through forkserver (spawn where that doesn't exist),
+    never forked from the server itself: forking a process that already runs
+    torch and thread pools can deadlock the child.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context(method))
+
+
+def iter_pdf_pages(content: bytes, workers: Optional[int] = None, pages_per_task: int = 16,
+                   pool: Optional[ProcessPoolExecutor] = None) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) pairs, 1-based, as soon as each page range is done.
+
+    Small documents are read in-process; larger ones are split into page ranges
+    across a process pool (PyPDF2 is pure Python, so threads wouldn't help):
+    `pool` if given, otherwise one created for this call. Pairs from a pool
+    arrive in completion order, not page order.
+    """
+    reader = _open_pdf(content)
+    page_count = len(reader.pages)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or page_count <= pages_per_task:
+        for i, page in enumerate(reader.pages):
+            yield i + 1, page.extract_text() or ""
+        return
+
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    own_pool = pool is None
+    if own_pool:
+        pool = create_pool(min(workers, len(ranges)))
+    # Workers read the document from a file instead of getting the bytes with every task
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    futures = []
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        # Ranges are handed out in order: a worker running one of the last `workers`
+        # lets the document go afterwards (re-parsing it if it gets another one)
+        tail = len(ranges) - workers
+        futures = [pool.submit(_extract_range, path, start, end, i >= tail)
+                   for i, (start, end) in enumerate(ranges)]
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        if own_pool:
+            pool.shutdown(wait=True)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def extract_pages(content: bytes, workers: Optional[int] = None,
+                  pool: Optional[ProcessPoolExecutor] = None) -> List[str]:
+    """Text of every page, in page order"""
+    pages = {}
+    for page_number, text in iter_pdf_pages(content, workers, pool=pool):
+        pages[page_number] = text
+    return [pages[i] for i in range(1, len(pages) + 1)]
@@ -0,0 +1,81 @@
+import re
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from kb_index import RetrievalResult
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case/punctuation/whitespace-insensitive form of an utterance"""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+class QueryCache:
+    """Bounded LRU caches for repeated utterances ("yes", "how much does it cost").
+
+    Embeddings are keyed by the normalized query alone; retrieval results by
+    (normalized query, k) for the current knowledge-base version. Seeing a new
+    index version drops every cached result, so uploads invalidate it automatically.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._results: "OrderedDict[Tuple[str, int], RetrievalResult]" = OrderedDict()
+        self._version: Optional[int] = None
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+
+    def get_embedding(self, key: str) -> Optional[np.ndarray]:
+        embedding = self._embeddings.get(key)
+        if embedding is None:
+            self.embedding_misses += 1
+            return None
+        self.embedding_hits += 1
+        self._embeddings.move_to_end(key)
+        return embedding
+
+    def put_embedding(self, key: str, embedding: np.ndarray):
+        self._put(self._embeddings, key, embedding)
+
+    def get_result(self, key: str, version: int, k: int) -> Optional[RetrievalResult]:
+        self._check_version(version)
+        result = self._results.get((key, k))
+        if result is None:
+            self.result_misses += 1
+            return None
+        self.result_hits += 1
+        self._results.move_to_end((key, k))
+        return result
+
+    def put_result(self, key: str, version: int, k: int, result: RetrievalResult):
+        # A result computed against a snapshot that has since been replaced is dropped
+        if version == self._version:
+            self._put(self._results, (key, k), result)
+
+    def stats(self) -> dict:
+        return {
+            "embedding_hits": self.embedding_hits,
+            "embedding_misses": self.embedding_misses,
+            "result_hits": self.result_hits,
+            "result_misses": self.result_misses,
+            "index_version": self._version,
+        }
+
+    def _check_version(self, version: int):
+        if version != self._version:
+            self._results.clear()
+            self._version = version
+
+    def _put(self, entries: OrderedDict, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
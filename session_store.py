@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+
+class SessionStore(ABC):
+    """Where call state and shared config live, so any worker can serve a call.
+
+    Sessions are compact JSON-able dicts (history, entities, end-call flags, KB
+    version) saved after each turn. Config is a single document (current prompt
+    and knowledge-base store version) with a revision number that workers poll
+    to pick up changes published by another worker.
+    """
+
+    @abstractmethod
+    def load_session(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def save_session(self, session_id: str, state: dict):
+        ...
+
+    @abstractmethod
+    def delete_session(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def purge_sessions(self, older_than: float):
+        """Drop sessions not saved since `older_than` (epoch seconds)"""
+        ...
+
+    @abstractmethod
+    def publish_config(self, config: dict) -> int:
+        """Replace the shared config; returns its new revision"""
+        ...
+
+    @abstractmethod
+    def config(self) -> Tuple[int, Optional[dict]]:
+        """(revision, config); revision 0 means nothing was published yet"""
+        ...
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Single-process store (the default, and for tests)"""
+
+    def __init__(self):
+        self._sessions: Dict[str, Tuple[float, dict]] = {}
+        self._config: Optional[dict] = None
+        self._revision = 0
+        self._lock = threading.Lock()
+
+    def load_session(self, session_id: str) -> Optional[dict]:
+        entry = self._sessions.get(session_id)
+        return json.loads(entry[1]) if entry else None
+
+    def save_session(self, session_id: str, state: dict):
+        # Stored serialized, like the shared backends, so callers can't alias live objects
+        self._sessions[session_id] = (time.time(), json.dumps(state))
+
+    def delete_session(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def purge_sessions(self, older_than: float):
+        for session_id, (saved, _) in list(self._sessions.items()):
+            if saved < older_than:
+                self._sessions.pop(session_id, None)
+
+    def publish_config(self, config: dict) -> int:
+        with self._lock:
+            self._revision += 1
+            self._config = dict(config)
+            return self._revision
+
+    def config(self) -> Tuple[int, Optional[dict]]:
+        return self._revision, self._config
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store in a local SQLite file, shared by every worker on the host.
+
+    WAL mode lets workers read while another one writes. Calls are blocking;
+    run them off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS config (id INTEGER PRIMARY KEY CHECK (id = 1), "
+            "revision INTEGER NOT NULL, data TEXT NOT NULL)"
+        )
+
+    def load_session(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_session(self, session_id: str, state: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), time.time())
+            )
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge_sessions(self, older_than: float):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE updated < ?", (older_than,))
+
+    def publish_config(self, config: dict) -> int:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT revision FROM config WHERE id = 1").fetchone()
+                revision = (row[0] if row else 0) + 1
+                self._db.execute(
+                    "INSERT OR REPLACE INTO config (id, revision, data) VALUES (1, ?, ?)",
+                    (revision, json.dumps(config))
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return revision
+
+    def config(self) -> Tuple[int, Optional[dict]]:
+        with self._lock:
+            row = self._db.execute("SELECT revision, data FROM config WHERE id = 1").fetchone()
+        return (row[0], json.loads(row[1])) if row else (0, None)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_session_store(url: str) -> SessionStore:
+    """`memory://` or `sqlite:///path/to/file.db`"""
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    if url in ("", "memory://"):
+        return MemorySessionStore()
+    raise ValueError(f"Unsupported session store: {url}")
@@ -5,6 +5,31 @@ class VoiceChatApp {
     this.isRecording = false;
     this.recognition = null;
 
+    // Streamed reply playback: chunks are decoded and scheduled back to back
+    this.audioContext = null;
+    this.playbackTime = 0;
+    this.audioChain = Promise.resolve();
+    this.nextSeq = 0;
+    this.pendingChunks = new Map();
+    this.currentAgentMessage = null;
+    this.awaitingAudio = null;
+
+    // Barge-in: replies from turns up to droppedTurn are discarded
+    this.activeSources = new Set();
+    this.playbackEpoch = 0;
+    this.latestTurn = 0;
+    this.droppedTurn = -1;
+
+    // Last interim transcript sent for speculative retrieval
+    this.lastPartial = "";
+
+    // Trace id of the latest reply, echoed back so server logs line up with ours
+    this.lastTraceId = null;
+    this.speechEndedAt = null;
+
+    // Lets a dropped connection continue the same call, on any server worker
+    this.sessionId = null;
+
     this.recordButton = document.getElementById("recordButton");
     this.status = document.getElementById("status");
     this.conversation = document.getElementById("conversation");
@@ -123,18 +148,27 @@ class VoiceChatApp {
         }
       }
 
+      // The caller started talking over the agent: stop the reply
+      if ((finalTranscript || interimTranscript) && this.isReplying()) {
+        this.interrupt();
+      }
+
       if (finalTranscript) {
+        this.lastPartial = "";
         this.addMessage(finalTranscript, "user");
+        this.speechEndedAt = performance.now();
         this.ws.send(
           JSON.stringify({
             action: "message",
             text: finalTranscript,
+            trace_id: this.lastTraceId,
           })
         );
       }
 
       if (interimTranscript) {
         this.updateInterimText(interimTranscript);
+        this.sendPartial(interimTranscript);
       }
     };
 
@@ -150,25 +184,63 @@ class VoiceChatApp {
     };
   }
 
+  sendPartial(text) {
+    // Lets the server start retrieval before the caller has finished speaking
+    if (text === this.lastPartial || !this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+    this.lastPartial = text;
+    this.ws.send(
+      JSON.stringify({
+        action: "partial",
+        text: text,
+      })
+    );
+  }
+
   initializeWebSocket() {
+    if (this.ws) {
+      this.ws.onclose = null;
+      this.ws.close();
+    }
+    // Turn numbers restart with every connection
+    this.latestTurn = 0;
+    this.droppedTurn = -1;
+    this.awaitingAudio = null;
+
+    const session = this.sessionId ? `&session=${encodeURIComponent(this.sessionId)}` : "";
     this.ws = new WebSocket(
-      `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws`
+      `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws?mode=stream&audio=binary${session}`
     );
+    this.ws.binaryType = "arraybuffer";
+
+    this.ws.onclose = (event) => {
+      // 1000 is a normal end of call; anything else (dropped, server busy) reconnects to the same session
+      if (event.code !== 1000 && this.sessionId) {
+        setTimeout(() => this.initializeWebSocket(), 2000);
+      }
+    };
     
     this.ws.onopen = () => {
       console.log("WebSocket connection established");
     };
 
-    this.ws.onmessage = async (event) => {
-      const data = JSON.parse(event.data);
+    this.ws.onmessage = (event) => {
+      // Binary frames carry the audio announced by the preceding control frame
+      if (event.data instanceof ArrayBuffer) {
+        const message = this.awaitingAudio;
+        this.awaitingAudio = null;
+        if (message) this.handleMessage(message, event.data);
+        return;
+      }
 
-      if (data.type === "ai_response") {
-        this.addMessage(data.text, "agent");
-        if (data.audio) {
-          const audio = new Audio("data:audio/wav;base64," + data.audio);
-          await audio.play();
-        }
+      const data = JSON.parse(event.data);
+      if (data.audio_frame) {
+        this.awaitingAudio = data;
+        return;
       }
+      this.handleMessage(
+        data,
+        data.audio ? this.base64ToArrayBuffer(data.audio) : null
+      );
     };
 
     this.ws.onerror = (error) => {
@@ -178,6 +250,132 @@ class VoiceChatApp {
     };
   }
 
+  handleMessage(data, audio) {
+    if (data.type === "session") {
+      this.sessionId = data.session_id;
+      return;
+    }
+
+    if (data.turn !== undefined) {
+      if (data.turn <= this.droppedTurn) return;
+      this.latestTurn = Math.max(this.latestTurn, data.turn);
+    }
+    if (data.trace_id) this.lastTraceId = data.trace_id;
+
+    if (data.type === "ai_response") {
+      this.addMessage(data.text, "agent");
+      if (audio) {
+        this.enqueueAudio(audio, data.trace_id);
+      }
+    } else if (data.type === "ai_response_chunk") {
+      this.pendingChunks.set(data.seq, { text: data.text, audio, traceId: data.trace_id });
+      this.drainChunks();
+    } else if (data.type === "ai_response_end") {
+      this.currentAgentMessage = null;
+      this.nextSeq = 0;
+      this.pendingChunks.clear();
+    }
+  }
+
+  drainChunks() {
+    // Play chunks strictly in sequence order, even if they arrive out of order
+    while (this.pendingChunks.has(this.nextSeq)) {
+      const chunk = this.pendingChunks.get(this.nextSeq);
+      this.pendingChunks.delete(this.nextSeq);
+      this.nextSeq++;
+
+      if (!this.currentAgentMessage) {
+        this.currentAgentMessage = this.addMessage(chunk.text, "agent");
+      } else {
+        this.currentAgentMessage.textContent += " " + chunk.text;
+      }
+      if (chunk.audio) {
+        this.enqueueAudio(chunk.audio, chunk.traceId);
+      }
+    }
+  }
+
+  isReplying() {
+    return this.activeSources.size > 0 || this.currentAgentMessage !== null;
+  }
+
+  interrupt() {
+    this.droppedTurn = this.latestTurn;
+    this.stopPlayback();
+    this.currentAgentMessage = null;
+    this.nextSeq = 0;
+    this.pendingChunks.clear();
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(
+        JSON.stringify({ action: "interrupt", trace_id: this.lastTraceId })
+      );
+    }
+  }
+
+  stopPlayback() {
+    // Clips still being decoded see the new epoch and are never scheduled
+    this.playbackEpoch++;
+    this.activeSources.forEach((source) => source.stop());
+    this.activeSources.clear();
+    this.audioChain = Promise.resolve();
+    this.playbackTime = 0;
+  }
+
+  enqueueAudio(arrayBuffer, traceId) {
+    // Decode one clip at a time so clips are scheduled in arrival order
+    const epoch = this.playbackEpoch;
+    this.audioChain = this.audioChain.then(() => this.scheduleAudio(arrayBuffer, epoch, traceId));
+    return this.audioChain;
+  }
+
+  reportFirstAudio(traceId, startAt) {
+    // Time from the end of the caller's speech to the first reply audio playing
+    if (this.speechEndedAt === null || !traceId) return;
+    const delay = Math.max(0, startAt - this.audioContext.currentTime) * 1000;
+    const firstAudioMs = performance.now() - this.speechEndedAt + delay;
+    this.speechEndedAt = null;
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(
+        JSON.stringify({
+          action: "timing",
+          trace_id: traceId,
+          first_audio_ms: firstAudioMs,
+        })
+      );
+    }
+  }
+
+  async scheduleAudio(arrayBuffer, epoch, traceId) {
+    if (!this.audioContext) {
+      this.audioContext = new (window.AudioContext || window.webkitAudioContext)();
+    }
+    try {
+      const buffer = await this.audioContext.decodeAudioData(arrayBuffer);
+      if (epoch !== this.playbackEpoch) return;
+      const source = this.audioContext.createBufferSource();
+      source.buffer = buffer;
+      source.connect(this.audioContext.destination);
+      this.activeSources.add(source);
+      source.onended = () => this.activeSources.delete(source);
+      // Start right where the previous chunk ends so sentences play without gaps
+      const startAt = Math.max(this.playbackTime, this.audioContext.currentTime);
+      source.start(startAt);
+      this.playbackTime = startAt + buffer.duration;
+      this.reportFirstAudio(traceId, startAt);
+    } catch (error) {
+      console.error("Audio playback error:", error);
+    }
+  }
+
+  base64ToArrayBuffer(base64) {
+    const binary = atob(base64);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+      bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes.buffer;
+  }
+
   setupEventListeners() {
     this.recordButton.addEventListener("click", () => {
       if (!this.isRecording) {
@@ -230,6 +428,7 @@ class VoiceChatApp {
     messageDiv.textContent = text;
     this.conversation.appendChild(messageDiv);
     messageDiv.scrollIntoView({ behavior: "smooth" });
+    return messageDiv;
   }
 
   updateInterimText(text) {
@@ -0,0 +1,87 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+ENTITY_MARKER = "[[ENTITIES]]"
+
+# End of a sentence: terminal punctuation, optional closing quote/bracket, then whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+@dataclass
+class ResponseChunk:
+    """One voiced piece of a streamed reply; the last chunk of a turn has final=True
+    and carries the full spoken text instead of audio."""
+    seq: int
+    text: str
+    audio: Optional[bytes] = None
+    final: bool = False
+    end_call: bool = False
+
+
+class SentenceSplitter:
+    """Cuts a token stream into speakable sentences.
+
+    Everything from the [[ENTITIES]] marker onwards is held back (never voiced),
+    including a partial marker at the end of the buffer, while `text` keeps the
+    whole completion for extract_entities.
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._parts: List[str] = []
+        self._pending = ""
+        self._done = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, delta: str) -> List[str]:
+        """Add a token delta; returns the sentences that are now complete"""
+        self._parts.append(delta)
+        if self._done:
+            return []
+        self._pending += delta
+
+        marker_at = self._pending.find(ENTITY_MARKER)
+        if marker_at != -1:
+            self._done = True
+            speakable, self._pending = self._pending[:marker_at], ""
+            return self._split(speakable, final=True)
+
+        # Don't split inside what might be the start of the marker
+        held = self._marker_prefix_len(self._pending)
+        speakable = self._pending[:len(self._pending) - held]
+        sentences = self._split(speakable, final=False)
+        consumed = sum(len(s) for s in sentences)
+        self._pending = self._pending[consumed:]
+        return [s.strip() for s in sentences if s.strip()]
+
+    def flush(self) -> List[str]:
+        """End of stream: whatever speakable text is left"""
+        if self._done:
+            return []
+        self._done = True
+        remaining, self._pending = self._pending, ""
+        return self._split(remaining, final=True)
+
+    def _split(self, text: str, final: bool) -> List[str]:
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(text):
+            if match.end() - start >= self.min_chars:
+                sentences.append(text[start:match.end()])
+                start = match.end()
+        if final:
+            if text[start:].strip():
+                sentences.append(text[start:])
+            return [s.strip() for s in sentences if s.strip()]
+        return sentences
+
+    @staticmethod
+    def _marker_prefix_len(text: str) -> int:
+        for n in range(min(len(ENTITY_MARKER) - 1, len(text)), 0, -1):
+            if text.endswith(ENTITY_MARKER[:n]):
+                return n
+        return 0
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+# Turns per session kept in memory for the call's rollup (the log has all of them)
+MAX_ROLLUP_TURNS = 2000
+# Rollup paths remembered for calls that may come back
+MAX_ROLLUP_PATHS = 10000
+
+
+class TranscriptRecorder:
+    """Write-behind log of call transcripts and captured entities.
+
+    `record` only serializes the event into a buffer; a background task
+    appends the buffer to an append-only JSONL log and fsyncs it every
+    `flush_interval` seconds (sooner once `max_batch` events are waiting), in a
+    thread, so disk I/O never sits on a turn. When a session closes its
+    transcript and final entities are rolled up into
+    <directory>/client_data_<ts>_<session>.json on the next flush, <ts> being
+    when the call started; a call that resumes later (here or on another
+    worker) passes the same start time and so extends the same file.
+
+    Logs: <directory>/logs/events-<YYYYMMDD>-<pid>.jsonl, one per worker and
+    UTC day, one JSON object per line: {"ts", "session", "type", ...} with
+    type "turn" (role, text, turn), "entities" (entities) or "end" (outcome).
+    """
+
+    def __init__(self, directory: Optional[str], flush_interval: float = 1.0, max_batch: int = 1000):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._lines: List[str] = []
+        self._sessions: Dict[str, dict] = {}
+        self._rollups: List[dict] = []
+        self._rollup_paths: "OrderedDict[str, str]" = OrderedDict()
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._log = None
+        self._log_path: Optional[str] = None
+        self.events = 0
+        self.flushes = 0
+        self.bytes_written = 0
+        self.rollups_written = 0
+        self.write_errors = 0
+        self.last_flush_ms = 0.0
+        if directory:
+            os.makedirs(os.path.join(directory, "logs"), exist_ok=True)
+
+    def start(self):
+        if self.directory:
+            self._wake = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out whatever is still buffered"""
+        if self._worker is not None:
+            # Not cancelled: a write in progress must finish before the last flush
+            self._stopping = True
+            self._wake.set()
+            await self._worker
+            self._worker = None
+        if self.directory:
+            await self._flush()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def record(self, session_id: str, kind: str, **fields):
+        """Buffer one event (no I/O); written on the next flush"""
+        if not self.directory:
+            return
+        event = {"ts": round(time.time(), 3), "session": session_id, "type": kind, **fields}
+        # Serialized now so later changes to the caller's objects can't leak in
+        self._lines.append(json.dumps(event, ensure_ascii=False))
+        self.events += 1
+        session = self._sessions.setdefault(session_id, {"started_at": event["ts"], "transcript": []})
+        if kind == "turn" and len(session["transcript"]) < MAX_ROLLUP_TURNS:
+            session["transcript"].append({"ts": event["ts"], "role": fields["role"], "text": fields["text"]})
+        if len(self._lines) >= self.max_batch and self._wake is not None:
+            self._wake.set()
+
+    def close_session(self, session_id: str, entities: dict, outcome: str, started_at: Optional[float] = None):
+        """Log the end of the call and queue its per-call rollup (`started_at`: when the
+        call first started, if that was before this worker saw it)"""
+        if not self.directory:
+            return
+        self.record(session_id, "end", outcome=outcome)
+        session = self._sessions.pop(session_id)
+        self._rollups.append({
+            "session_id": session_id,
+            "started_at": round(started_at, 3) if started_at is not None else session["started_at"],
+            "ended_at": round(time.time(), 3),
+            "outcome": outcome,
+            "entities": json.loads(json.dumps(entities)),
+            "transcript": session["transcript"],
+        })
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "pending": len(self._lines),
+            "open_sessions": len(self._sessions),
+            "flushes": self.flushes,
+            "bytes_written": self.bytes_written,
+            "rollups_written": self.rollups_written,
+            "write_errors": self.write_errors,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+
+    async def _flush(self):
+        if not self._lines and not self._rollups:
+            return
+        lines, self._lines = self._lines, []
+        rollups, self._rollups = self._rollups, []
+        started = time.perf_counter()
+        try:
+            failed = await asyncio.to_thread(self._write, lines, rollups)
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Error writing call transcripts: {str(e)}")
+            # Retried on the next flush, ahead of anything recorded since
+            self._lines[:0] = lines
+            self._rollups[:0] = rollups
+            return
+        self._rollups[:0] = failed
+        self.flushes += 1
+        self.last_flush_ms = 1000 * (time.perf_counter() - started)
+
+    def _write(self, lines: List[str], rollups: List[dict]) -> List[dict]:
+        """Append and fsync the log, then write the rollups; returns the rollups that failed"""
+        if lines:
+            path = os.path.join(self.directory, "logs",
+                                f"events-{datetime.now(timezone.utc):%Y%m%d}-{os.getpid()}.jsonl")
+            if path != self._log_path:
+                if self._log is not None:
+                    self._log.close()
+                self._log = open(path, "ab")
+                self._log_path = path
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            self._log.write(data)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self.bytes_written += len(data)
+        # Rollups go after the log, so a rollup never has events the log lacks
+        failed = []
+        for rollup in rollups:
+            try:
+                self._write_rollup(rollup)
+                self.rollups_written += 1
+            except OSError as e:
+                self.write_errors += 1
+                print(f"Error writing rollup of call {rollup['session_id']}: {str(e)}")
+                failed.append(rollup)
+        return failed
+
+    def _write_rollup(self, rollup: dict):
+        session_id = rollup["session_id"]
+        # Known from an earlier rollup, else derived from the start time: no directory scan
+        path = self._rollup_paths.get(session_id) or os.path.join(
+            self.directory, f"client_data_{int(rollup['started_at'])}_{session_id}.json")
+        data = rollup_record(rollup)
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    previous = json.load(f)
+                data["started_at"] = previous.get("started_at", data["started_at"])
+                data["transcript"] = previous.get("transcript", []) + data["transcript"]
+            except (OSError, ValueError) as e:
+                print(f"Replacing unreadable call rollup {path}: {str(e)}")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._rollup_paths[session_id] = path
+        self._rollup_paths.move_to_end(session_id)
+        if len(self._rollup_paths) > MAX_ROLLUP_PATHS:
+            self._rollup_paths.popitem(last=False)
+
+
+def rollup_record(rollup: dict) -> dict:
+    """Per-call JSON: the client_entities fields at the top level (the shape of the
+    older client_data files) plus the call's metadata and transcript"""
+    return {
+        **rollup["entities"],
+        "session_id": rollup["session_id"],
+        "started_at": rollup["started_at"],
+        "ended_at": rollup["ended_at"],
+        "outcome": rollup["outcome"],
+        "transcript": rollup["transcript"],
+    }
+
+
+def read_events(directory: str, since: Optional[float] = None, until: Optional[float] = None,
+                session_id: Optional[str] = None) -> Iterator[dict]:
+    """Stream logged events from every worker's logs, file by file in date order.
+
+    Lines are parsed one at a time, so exports don't load whole logs; a torn
+    last line (a worker killed mid-write) is skipped.
+    """
+    paths = sorted(glob.glob(os.path.join(glob.escape(directory), "logs", "events-*.jsonl")))
+    for path in paths:
+        # events-<YYYYMMDD>-<pid>: skip whole days outside the range
+        day = os.path.basename(path).split("-")[1]
+        day_start = datetime.strptime(day, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+        if (since is not None and day_start + 86400 <= since) or (until is not None and day_start >= until):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if since is not None and event["ts"] < since:
+                    continue
+                if until is not None and event["ts"] >= until:
+                    continue
+                if session_id is not None and event["session"] != session_id:
+                    continue
+                yield event
+
+
+def export_calls(directory: str, since: Optional[float] = None, until: Optional[float] = None,
+                 session_id: Optional[str] = None) -> Iterator[dict]:
+    """Per-call records rebuilt from the logs, including calls whose rollup was never written"""
+    calls: Dict[str, dict] = {}
+    for event in read_events(directory, since, until, session_id):
+        call = calls.setdefault(event["session"], {
+            "session_id": event["session"], "started_at": event["ts"], "ended_at": None,
+            "outcome": None, "entities": {}, "transcript": [],
+        })
+        if event["type"] == "turn":
+            call["transcript"].append({"ts": event["ts"], "role": event["role"], "text": event["text"]})
+        elif event["type"] == "entities":
+            call["entities"] = event["entities"]
+        elif event["type"] == "end":
+            call["ended_at"], call["outcome"] = event["ts"], event["outcome"]
+    for call in sorted(calls.values(), key=lambda c: c["started_at"]):
+        yield rollup_record(call)
+
+
+def _timestamp(value: str) -> float:
+    """Epoch seconds or an ISO date/time (UTC unless it has an offset)"""
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export logged call transcripts and entities as JSONL")
+    parser.add_argument("--dir", default="client_conversation", help="Recorder directory (TRANSCRIPT_DIR)")
+    parser.add_argument("--since", type=_timestamp, help="Epoch seconds or ISO time, inclusive")
+    parser.add_argument("--until", type=_timestamp, help="Epoch seconds or ISO time, exclusive")
+    parser.add_argument("--session", help="Only this session's events")
+    parser.add_argument("--calls", action="store_true", help="One record per call instead of raw events")
+    args = parser.parse_args()
+
+    if args.calls:
+        records = export_calls(args.dir, args.since, args.until, args.session)
+    else:
+        records = read_events(args.dir, args.since, args.until, args.session)
+    for record in records:
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+Synthesizer = Callable[[str, str, str], Awaitable[bytes]]
+
+
+class AudioCache:
+    """Content-addressed cache of synthesized speech keyed by (text, voice, model).
+
+    Memory tier: LRU bounded by total audio bytes; pinned entries (the static
+    phrases prewarmed at startup) are never evicted. Disk tier (optional): one
+    file per key under `disk_dir`, written for pinned entries and for any clip
+    that is requested a second time, so one-off LLM sentences don't fill the disk.
+    The disk tier is LRU too, bounded by `disk_max_bytes` (files left from
+    earlier runs are ordered by mtime). Concurrent misses for the same key share
+    a single TTS call.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._pinned: Set[str] = set()
+        # key -> file size, least recently used first
+        self._on_disk: "OrderedDict[str, int]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._writes: Set[asyncio.Task] = set()
+        self.bytes = 0
+        self.disk_bytes = 0
+        self.disk_evictions = 0
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            files = []
+            for name in os.listdir(disk_dir):
+                if name.endswith(".audio"):
+                    try:
+                        stat = os.stat(os.path.join(disk_dir, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, name[:-len(".audio")], stat.st_size))
+            for _, key, size in sorted(files):
+                self._on_disk[key] = size
+                self.disk_bytes += size
+            for key in self._disk_victims():
+                self._remove_file(key)
+
+    @staticmethod
+    def key(text: str, voice: str, model: str) -> str:
+        return hashlib.sha256(f"{voice}\0{model}\0{text}".encode("utf-8")).hexdigest()
+
+    async def get_or_synthesize(self, text: str, voice: str, model: str,
+                                synthesize: Synthesizer, pin: bool = False) -> bytes:
+        key = self.key(text, voice, model)
+
+        audio = self._entries.get(key)
+        if audio is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            if key in self._on_disk:
+                self._on_disk.move_to_end(key)
+            if pin:
+                self._pinned.add(key)
+            # Requested again: worth keeping across restarts (written off the turn path)
+            self._persist_later(key, audio)
+            return audio
+
+        if key in self._inflight:
+            self.hits += 1
+            inflight = self._inflight[key]
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The caller that started this synthesis was interrupted; take it over
+                if not inflight.cancelled():
+                    raise
+            return await self.get_or_synthesize(text, voice, model, synthesize, pin)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            audio = await self._read_disk(key)
+            if audio is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                audio = await synthesize(text, voice, model)
+                if pin:
+                    await self._persist(key, audio)
+            self._store(key, audio, pin)
+            future.set_result(audio)
+            return audio
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't leave an unretrieved exception behind
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def prewarm(self, phrases: Iterable[str], voice: str, model: str, synthesize: Synthesizer) -> int:
+        """Synthesize (or load from disk) and pin the known static phrases; returns how many failed"""
+        phrases = list(phrases)
+        results = await asyncio.gather(
+            *(self.get_or_synthesize(text, voice, model, synthesize, pin=True) for text in phrases),
+            return_exceptions=True
+        )
+        for text, result in zip(phrases, results):
+            if isinstance(result, BaseException):
+                print(f"Error prewarming audio for '{text}': {str(result)}")
+        print(f"Audio cache prewarmed: {len(self._pinned)} pinned clips, {self.bytes} bytes")
+        return sum(isinstance(result, BaseException) for result in results)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "pinned": len(self._pinned),
+            "disk_entries": len(self._on_disk),
+            "disk_bytes": self.disk_bytes,
+            "disk_evictions": self.disk_evictions,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _store(self, key: str, audio: bytes, pin: bool):
+        if key in self._entries:
+            self.bytes -= len(self._entries.pop(key))
+        self._entries[key] = audio
+        self.bytes += len(audio)
+        if pin:
+            self._pinned.add(key)
+        for old_key in list(self._entries):
+            if self.bytes <= self.max_bytes:
+                break
+            if old_key in self._pinned or old_key == key:
+                continue
+            self.bytes -= len(self._entries.pop(old_key))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.audio")
+
+    async def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir or key not in self._on_disk:
+            return None
+        self._on_disk.move_to_end(key)
+
+        def read():
+            try:
+                with open(self._path(key), "rb") as f:
+                    return f.read()
+            except OSError:
+                return None
+
+        audio = await asyncio.to_thread(read)
+        if audio is None and key in self._on_disk:
+            # Removed underneath us (evicted meanwhile, or cleaned up by hand)
+            self.disk_bytes -= self._on_disk.pop(key)
+        return audio
+
+    def _disk_victims(self, keep: Optional[str] = None):
+        """Drop least recently used files from the index until the disk tier fits; returns their keys"""
+        victims = []
+        for key in list(self._on_disk):
+            if self.disk_bytes <= self.disk_max_bytes:
+                break
+            if key in self._pinned or key == keep:
+                continue
+            self.disk_bytes -= self._on_disk.pop(key)
+            self.disk_evictions += 1
+            victims.append(key)
+        return victims
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _persist_later(self, key: str, audio: bytes):
+        if not self.disk_dir or key in self._on_disk:
+            return
+        task = asyncio.create_task(self._persist(key, audio))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _persist(self, key: str, audio: bytes):
+        if not self.disk_dir or key in self._on_disk:
+            return
+        self._on_disk[key] = len(audio)
+        self.disk_bytes += len(audio)
+        victims = self._disk_victims(keep=key)
+
+        def write():
+            for victim in victims:
+                self._remove_file(victim)
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, self._path(key))
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as e:
+            if key in self._on_disk:
+                self.disk_bytes -= self._on_disk.pop(key)
+            print(f"Error writing audio cache entry: {str(e)}")